@@ -0,0 +1,355 @@
+# Throughput and latency benchmarks for every memory module.
+#
+# Only runs when MEMUTILS_BENCH_OUTPUT is set, to the path of the JSON
+# report, so `veryl test` skips it. `just bench` sets it.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ReadOnly, RisingEdge
+from memutils_tb import (
+    BramPortBundle, MemoryBackdoor, ScratchpadReadBundle, ScratchpadWriteBundle, WishboneMaster,
+    WishboneTransaction, idle_bus,
+)
+import json
+import os
+import random
+import statistics
+import time
+
+BENCH_OUTPUT = os.environ.get("MEMUTILS_BENCH_OUTPUT")
+
+# Transactions per port, for each access pattern
+NUM_TRANSACTIONS = 4096
+# Reads timed one at a time, to measure latency on the raw RAMs,
+# each to a different address
+NUM_LATENCY_PROBES = 16
+
+PATTERNS = ["sequential_write", "sequential_read", "random_mixed"]
+
+# Instances of BenchmarkTest, see src/tests/test_benchmark.veryl
+WISHBONE_RAMS = [
+    # (RAM, bus, size in bytes, data width)
+    ("ram_1k_32", "wb_ram_1k_32", 1024, 32),
+    ("ram_64k_32", "wb_ram_64k_32", 65536, 32),
+    ("ram_64k_64", "wb_ram_64k_64", 65536, 64),
+]
+WISHBONE_DUAL_PORT_RAMS = [
+    # (RAM, bus prefix, size in bytes, data width)
+    ("dp_ram_4k_32", "wb_dp_4k_32", 4096, 32),
+    ("dp_ram_64k_64", "wb_dp_64k_64", 65536, 64),
+]
+SCRATCHPAD_RAMS = [
+    # (RAM, depth, data width, read ports)
+    ("spad_32x32", 32, 32, 2),
+    ("spad_1k_64", 1024, 64, 2),
+]
+SINGLE_PORT_BRAMS = [
+    # (RAM, depth, data width)
+    ("sp_1k_32", 1024, 32),
+    ("sp_8k_64", 8192, 64),
+]
+DUAL_PORT_BRAMS = [
+    # (RAM, depth, data width)
+    ("dp_1k_32", 1024, 32),
+    ("dp_8k_64", 8192, 64),
+]
+
+results = []
+
+
+def record(module, instance, params, pattern, transactions, cycles, wall_time, latencies):
+    result = {
+        "module": module,
+        "instance": instance,
+        "params": params,
+        "pattern": pattern,
+        "transactions": transactions,
+        "cycles": cycles,
+        "transactions_per_cycle": transactions / cycles,
+        "read_latency": None,
+        "wall_seconds_per_cycle": wall_time / cycles,
+    }
+    if latencies:
+        result["read_latency"] = {
+            "mean": statistics.fmean(latencies),
+            "min": min(latencies),
+            "max": max(latencies),
+        }
+    results.append(result)
+
+    # Rewritten after every result, so an interrupted run keeps what it measured
+    report = {
+        "memutils_version": os.environ.get("MEMUTILS_VERSION"),
+        "simulator": cocotb.SIM_NAME,
+        "simulator_version": cocotb.SIM_VERSION,
+        "num_transactions": NUM_TRANSACTIONS,
+        "results": results,
+    }
+    with open(BENCH_OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def accesses(pattern, words, count, rng, offset=0):
+    """(word index, write) pairs for an access pattern,
+    over `words` words starting at `offset`"""
+    if pattern == "sequential_write":
+        return [(offset + i % words, True) for i in range(count)]
+    if pattern == "sequential_read":
+        return [(offset + i % words, False) for i in range(count)]
+    return [(offset + rng.randrange(words), rng.random() < 0.5) for _ in range(count)]
+
+
+async def reset(dut):
+    dut.rst.value = 1
+    for wb in [dut.wb_ram_1k_32, dut.wb_ram_64k_32, dut.wb_ram_64k_64,
+               dut.wb_dp_4k_32_a, dut.wb_dp_4k_32_b, dut.wb_dp_64k_64_a, dut.wb_dp_64k_64_b]:
+        idle_bus(wb)
+    for ram, _, _, read_ports in SCRATCHPAD_RAMS:
+        getattr(dut, f"{ram}_write")[0].write_enable.value = 0
+        for i in range(read_ports):
+            getattr(dut, f"{ram}_read")[i].address.value = 0
+    for ram, _, _ in SINGLE_PORT_BRAMS:
+        idle_bram_port(getattr(dut, f"{ram}_port"))
+    for ram, _, _ in DUAL_PORT_BRAMS:
+        idle_bram_port(getattr(dut, f"{ram}_port_a"))
+        idle_bram_port(getattr(dut, f"{ram}_port_b"))
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+
+def idle_bram_port(port):
+    port.enable.value = 0
+    port.byte_write_enable.value = 0
+    port.address.value = 0
+    port.write_data.value = 0
+
+
+async def probe_latency(dut, set_address, read_data, expected):
+    """Rising edges between presenting a read address and
+    the expected data showing up, 0 for asynchronous reads"""
+    set_address()
+    await ReadOnly()
+    cycles = 0
+    while read_data() != expected:
+        await RisingEdge(dut.clk)
+        await ReadOnly()
+        cycles += 1
+        assert cycles <= 8, "Read data never showed up"
+    # Leave the read-only phase
+    await RisingEdge(dut.clk)
+    return cycles
+
+
+def unique_words(depth, data_width, rng):
+    # Distinct values, so a probe can tell one word from another
+    return [(rng.getrandbits(data_width - 16) << 16) | i for i in range(depth)]
+
+
+@cocotb.test(skip=BENCH_OUTPUT is None)
+async def wishbone_ram_benchmark(dut):
+    """WishboneRam: pipelined traffic from one master"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await reset(dut)
+
+    for ram, bus, size, data_width in WISHBONE_RAMS:
+        word_bytes = data_width // 8
+        words = size // word_bytes
+        rng = random.Random(size * data_width)
+        master = WishboneMaster(dut.clk, getattr(dut, bus), data_width)
+
+        for pattern in PATTERNS:
+            requests = [
+                WishboneTransaction(word_bytes * index, write, rng.getrandbits(data_width))
+                for index, write in accesses(pattern, words, NUM_TRANSACTIONS, rng)
+            ]
+            start_cycle = master.cycle
+            start = time.perf_counter()
+            transactions = await master.run(requests)
+            wall_time = time.perf_counter() - start
+
+            assert all(t.ack for t in transactions)
+            record(
+                "WishboneRam", ram, {"SIZE": size, "DATA_WIDTH": data_width}, pattern,
+                len(transactions), master.cycle - start_cycle, wall_time,
+                [t.latency for t in transactions if not t.write],
+            )
+        master.stop()
+
+
+@cocotb.test(skip=BENCH_OUTPUT is None)
+async def wishbone_dual_port_ram_benchmark(dut):
+    """WishboneDualPortRam: one master per port, each on its own half of the RAM"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await reset(dut)
+
+    for ram, bus, size, data_width in WISHBONE_DUAL_PORT_RAMS:
+        word_bytes = data_width // 8
+        half = size // word_bytes // 2
+        rng = random.Random(size * data_width)
+        masters = [
+            WishboneMaster(dut.clk, getattr(dut, f"{bus}_a"), data_width),
+            WishboneMaster(dut.clk, getattr(dut, f"{bus}_b"), data_width),
+        ]
+
+        for pattern in PATTERNS:
+            start_cycle = masters[0].cycle
+            start = time.perf_counter()
+            transactions = []
+            for i, master in enumerate(masters):
+                for index, write in accesses(pattern, half, NUM_TRANSACTIONS, rng, i * half):
+                    transactions.append(master.submit(
+                        WishboneTransaction(word_bytes * index, write, rng.getrandbits(data_width))
+                    ))
+            for master in masters:
+                await master.wait_idle()
+            wall_time = time.perf_counter() - start
+
+            assert all(t.ack for t in transactions)
+            record(
+                "WishboneDualPortRam", ram, {"SIZE": size, "DATA_WIDTH": data_width}, pattern,
+                len(transactions), masters[0].cycle - start_cycle, wall_time,
+                [t.latency for t in transactions if not t.write],
+            )
+        for master in masters:
+            master.stop()
+
+
+@cocotb.test(skip=BENCH_OUTPUT is None)
+async def scratchpad_ram_benchmark(dut):
+    """ScratchpadRam: a write and a read on every port, every cycle"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await reset(dut)
+
+    for ram, depth, data_width, read_ports in SCRATCHPAD_RAMS:
+        rng = random.Random(depth * data_width)
+        write_port = getattr(dut, f"{ram}_write")[0]
+        read = [getattr(dut, f"{ram}_read")[i] for i in range(read_ports)]
+        backdoor = MemoryBackdoor(getattr(dut, ram))
+        contents = unique_words(depth, data_width, rng)
+        backdoor.load(contents)
+
+        latencies = []
+        for address in rng.sample(range(depth), NUM_LATENCY_PROBES):
+            latencies.append(await probe_latency(
+                dut,
+                lambda: setattr(read[0].address, "value", address),
+                lambda: read[0].data.value,
+                contents[address],
+            ))
+
+        for pattern in PATTERNS:
+            writes = accesses(pattern, depth, NUM_TRANSACTIONS, rng)
+            reads = [accesses(pattern, depth, NUM_TRANSACTIONS, rng) for _ in read]
+            start = time.perf_counter()
+            write_bundle = ScratchpadWriteBundle(write_port)
+            read_bundles = [ScratchpadReadBundle(port) for port in read]
+            clk = RisingEdge(dut.clk)
+            for cycle in range(NUM_TRANSACTIONS):
+                address, write = writes[cycle]
+                write_bundle.write(address=address, data=rng.getrandbits(data_width), write_enable=int(write))
+                for port, port_reads in zip(read_bundles, reads):
+                    port.write(address=port_reads[cycle][0])
+                await clk
+            write_bundle.write(write_enable=0)
+            wall_time = time.perf_counter() - start
+
+            # Read ports are asynchronous, so they all read every cycle
+            num_writes = sum(write for _, write in writes)
+            record(
+                "ScratchpadRam", ram, {"DEPTH": depth, "DATA_WIDTH": data_width, "READ_PORTS": read_ports},
+                pattern, num_writes + NUM_TRANSACTIONS * read_ports, NUM_TRANSACTIONS, wall_time, latencies,
+            )
+
+
+async def drive_bram(dut, ports, traces, data_width, rng):
+    """Issue one access per port per cycle, then wait for the last read"""
+    ports = [BramPortBundle(port) for port in ports]
+    full = (1 << (data_width // 8)) - 1
+    clk = RisingEdge(dut.clk)
+    for cycle in range(NUM_TRANSACTIONS):
+        for port, trace in zip(ports, traces):
+            address, write = trace[cycle]
+            port.write(
+                enable=1,
+                address=address,
+                write_data=rng.getrandbits(data_width),
+                byte_write_enable=full if write else 0,
+            )
+        await clk
+    for port in ports:
+        port.idle()
+    await clk
+    return NUM_TRANSACTIONS + 1
+
+
+@cocotb.test(skip=BENCH_OUTPUT is None)
+async def single_port_bram_benchmark(dut):
+    """SinglePortBlockRam: one access every cycle"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await reset(dut)
+
+    for ram, depth, data_width in SINGLE_PORT_BRAMS:
+        rng = random.Random(depth * data_width)
+        port = getattr(dut, f"{ram}_port")
+        contents = unique_words(depth, data_width, rng)
+        MemoryBackdoor(getattr(dut, ram)).load(contents)
+
+        port.enable.value = 1
+        latencies = []
+        for address in rng.sample(range(depth), NUM_LATENCY_PROBES):
+            latencies.append(await probe_latency(
+                dut,
+                lambda: setattr(port.address, "value", address),
+                lambda: port.read_data.value,
+                contents[address],
+            ))
+        idle_bram_port(port)
+
+        for pattern in PATTERNS:
+            trace = accesses(pattern, depth, NUM_TRANSACTIONS, rng)
+            start = time.perf_counter()
+            cycles = await drive_bram(dut, [port], [trace], data_width, rng)
+            wall_time = time.perf_counter() - start
+
+            record(
+                "SinglePortBlockRam", ram, {"RAM_DEPTH": depth, "DATA_WIDTH": data_width}, pattern,
+                NUM_TRANSACTIONS, cycles, wall_time, latencies,
+            )
+
+
+@cocotb.test(skip=BENCH_OUTPUT is None)
+async def dual_port_bram_benchmark(dut):
+    """DualPortBlockRam: one access per port every cycle, each port on its own half"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await reset(dut)
+
+    for ram, depth, data_width in DUAL_PORT_BRAMS:
+        rng = random.Random(depth * data_width)
+        ports = [getattr(dut, f"{ram}_port_a"), getattr(dut, f"{ram}_port_b")]
+        contents = unique_words(depth, data_width, rng)
+        MemoryBackdoor(getattr(dut, ram)).load(contents)
+
+        ports[0].enable.value = 1
+        latencies = []
+        for address in rng.sample(range(depth), NUM_LATENCY_PROBES):
+            latencies.append(await probe_latency(
+                dut,
+                lambda: setattr(ports[0].address, "value", address),
+                lambda: ports[0].read_data.value,
+                contents[address],
+            ))
+        idle_bram_port(ports[0])
+
+        half = depth // 2
+        for pattern in PATTERNS:
+            traces = [accesses(pattern, half, NUM_TRANSACTIONS, rng, i * half) for i in range(2)]
+            start = time.perf_counter()
+            cycles = await drive_bram(dut, ports, traces, data_width, rng)
+            wall_time = time.perf_counter() - start
+
+            record(
+                "DualPortBlockRam", ram, {"RAM_DEPTH": depth, "DATA_WIDTH": data_width}, pattern,
+                2 * NUM_TRANSACTIONS, cycles, wall_time, latencies,
+            )
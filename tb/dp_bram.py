@@ -1,15 +1,33 @@
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
+from memutils_tb import BramPortBundle, MemoryBackdoor, MemoryModel, Scoreboard, byte_mask
+import numpy as np
 
 def assert_read_port(port, address, expected):
     assert port.read_data.value == expected, \
         f"Error at {port} address {address}: expected {hex(expected)}, got {hex(port.read_data.value)}"
 
+# Read-during-write modes and collision policies, as in DualPortBlockRamPkg
+READ_FIRST, WRITE_FIRST, NO_CHANGE = range(3)
+COLLISION_NONE, COLLISION_PORT_A, COLLISION_FLAG = range(3)
+
+# Instances of TestDualPortBlockRam: (port A, port B, collision output,
+# RDW mode of each port, collision policy, read latency)
+RAMS = {
+    "ram": ("port_a", "port_b", "collision", (READ_FIRST, READ_FIRST), COLLISION_NONE, 1),
+    "ram_write_first": ("wf_port_a", "wf_port_b", "wf_collision", (WRITE_FIRST, WRITE_FIRST), COLLISION_PORT_A, 1),
+    "ram_no_change": ("nc_port_a", "nc_port_b", "nc_collision", (NO_CHANGE, NO_CHANGE), COLLISION_FLAG, 1),
+    "ram_mixed": ("mixed_port_a", "mixed_port_b", "mixed_collision", (WRITE_FIRST, NO_CHANGE), COLLISION_FLAG, 2),
+}
+
 @cocotb.coroutine
 async def reset(dut):
     dut.rst.value = 0
-    dut.ram.mem.value = [0] * len(dut.ram.mem.value)
+    for ram, (*ports, _, _, _, _) in RAMS.items():
+        MemoryBackdoor(getattr(dut, ram)).fill(0)
+        for port in ports:
+            BramPortBundle(getattr(dut, port)).idle()
     await RisingEdge(dut.clk)
     for port in ['port_a', 'port_b']:
         getattr(dut, port).enable.value = 0
@@ -88,10 +106,7 @@ async def memory_data_test(dut):
         await reset(dut)
         dut.port_a.enable.value = 1
         dut.port_b.enable.value = 1
-        mask = 0
-        for j in range(4):
-            if (byte_enable >> j) & 1:
-                mask |= (0xFF << (j * 8))
+        mask = byte_mask(byte_enable)
         print(f"mask: {mask}")
         for address, data in test_data:
             dut.port_a.address.value = address
@@ -107,7 +122,7 @@ async def memory_data_test(dut):
             await RisingEdge(dut.clk)
             
             read_val = dut.port_b.read_data.value
-            mem_val = dut.ram.mem.value[int(address/4)]
+            mem_val = MemoryBackdoor(dut.ram)[int(address/4)]
             assert (read_val & mask) == (data & mask)
             assert (read_val & ~mask) == (mem_val & ~mask)
 
@@ -130,4 +145,230 @@ async def memory_data_test(dut):
     await RisingEdge(dut.clk)
 
     assert dut.port_a.read_data.value == 0xB1AB2
-    assert dut.port_b.read_data.value == 0x7777
\ No newline at end of file
+    assert dut.port_b.read_data.value == 0x7777
+
+NUM_WRITES = 100_000
+
+@cocotb.test()
+async def random_write_scoreboard_test(dut):
+    """Random byte-enable writes on both ports, checked against the reference model in one go"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    backdoor = MemoryBackdoor(dut.ram)
+    model = MemoryModel(4 * len(backdoor))
+    half = len(backdoor) // 2
+
+    # Each port writes its own half, so both can write every cycle
+    rng = np.random.default_rng(0)
+    addresses = rng.integers(0, half, (NUM_WRITES // 2, 2)) + np.array([0, half])
+    data = rng.integers(0, 1 << 32, (NUM_WRITES // 2, 2), dtype=np.uint64)
+    selects = rng.integers(0, 16, (NUM_WRITES // 2, 2))
+
+    ports = [BramPortBundle(dut.port_a), BramPortBundle(dut.port_b)]
+    clk = RisingEdge(dut.clk)
+    for row_addresses, row_data, row_selects in zip(addresses.tolist(), data.tolist(), selects.tolist()):
+        for port, address, word, select in zip(ports, row_addresses, row_data, row_selects):
+            port.write(enable=1, address=address, write_data=word, byte_write_enable=select)
+        await clk
+    for port in ports:
+        port.idle()
+    await clk
+
+    model.write_many(4 * addresses.ravel(), data.ravel(), selects.ravel())
+    Scoreboard(model, backdoor).check()
+
+class DualPortModel:
+    """Cycle model of a DualPortBlockRam, with both ports on the same clock.
+
+    Words are (value, unknown byte mask). Bytes written by both ports in
+    the same cycle are unknown, unless port A wins"""
+
+    def __init__(self, rdw_modes, policy, latency, num_col=4):
+        self.rdw_modes = rdw_modes
+        self.policy = policy
+        self.latency = latency
+        self.num_col = num_col
+        self.all_bytes = (1 << num_col) - 1
+        self.mem = {}
+        # Memory output registers, then output registers if any
+        self.read_data = [(0, self.all_bytes)] * 2
+        self.collision = None
+        self.output = ([(0, self.all_bytes)] * 2, None)
+
+    def word(self, address):
+        return self.mem.get(address, (0, 0))
+
+    def outputs(self):
+        """(read data of each port, collision), as seen on the ports"""
+        if self.latency == 1:
+            return self.read_data, self.collision
+        return self.output
+
+    def step(self, requests):
+        """Clock edge, with an (enable, address, write data, byte enable) request per port"""
+        (enable_a, address_a, data_a, select_a), (enable_b, address_b, data_b, select_b) = requests
+        same_word = enable_a and enable_b and address_a == address_b
+        colliding = select_a & select_b if same_word else 0
+        written = [(data_a, select_a), (data_b, select_b)]
+        if self.policy == COLLISION_PORT_A:
+            mask = byte_mask(colliding)
+            written[1] = ((data_a & mask) | (data_b & ~mask), select_b)
+
+        # Reads see the memory before this edge's writes
+        read_data = list(self.read_data)
+        for p, (enable, address, _, select) in enumerate(requests):
+            if not enable:
+                continue
+            mode = self.rdw_modes[p]
+            if mode == NO_CHANGE and select:
+                continue
+            value, unknown = self.word(address)
+            if mode == WRITE_FIRST:
+                data, _ = written[p]
+                mask = byte_mask(select)
+                value = (value & ~mask) | (data & mask)
+                unknown &= ~select
+            read_data[p] = (value, unknown)
+
+        for p, (enable, address, data, select) in enumerate(requests):
+            if not enable:
+                continue
+            if p == 1 and self.policy == COLLISION_PORT_A:
+                select &= ~colliding
+            value, unknown = self.word(address)
+            mask = byte_mask(select)
+            self.mem[address] = ((value & ~mask) | (data & mask), unknown & ~select)
+        if colliding and self.policy != COLLISION_PORT_A:
+            value, unknown = self.mem[address_a]
+            self.mem[address_a] = (value, unknown | colliding)
+
+        collision = int(colliding != 0) if self.policy != COLLISION_NONE else 0
+        self.output = (self.read_data, self.collision)
+        self.read_data = read_data
+        self.collision = collision
+
+def check_word(name, got, expected, num_col=4):
+    """Compare the known bytes of a (value, unknown mask) word with a sampled value"""
+    value, unknown = expected
+    mask = byte_mask(~unknown & ((1 << num_col) - 1))
+    assert got is not None or mask == 0, f"{name}: expected {hex(value)}, got X"
+    if mask:
+        assert got & mask == value & mask, f"{name}: expected {hex(value)}, got {hex(got)} (mask {hex(mask)})"
+
+async def run_model(dut, ram, requests, model=None):
+    """Drive a list of (request A, request B) cycles into `ram`, checking
+    read data and the collision flag against the model on every cycle.
+    Returns the model, to carry the contents over to the next call"""
+    port_a, port_b, collision, rdw_modes, policy, latency = RAMS[ram]
+    ports = [BramPortBundle(getattr(dut, port_a)), BramPortBundle(getattr(dut, port_b))]
+    collision = getattr(dut, collision)
+    if model is None:
+        model = DualPortModel(rdw_modes, policy, latency)
+
+    clk = RisingEdge(dut.clk)
+    # Start from known read data and output registers
+    for port in ports:
+        port.write(enable=1, address=0, write_data=0, byte_write_enable=0)
+    for _ in range(latency):
+        await clk
+        model.step([(1, 0, 0, 0)] * 2)
+
+    for cycle, request in enumerate(requests + [((0, 0, 0, 0), (0, 0, 0, 0))] * latency):
+        for port, (enable, address, data, select) in zip(ports, request):
+            port.write(enable=enable, address=address, write_data=data, byte_write_enable=select)
+        await clk
+        read_data, expected_collision = model.outputs()
+        for p, port in enumerate(ports):
+            check_word(f"{ram} port {'AB'[p]}, cycle {cycle}", port.sample().read_data, read_data[p])
+        if expected_collision is not None:
+            assert collision.value == expected_collision, \
+                f"{ram} cycle {cycle}: expected collision {expected_collision}, got {collision.value}"
+        model.step(request)
+
+    for port in ports:
+        port.idle()
+    await clk
+    return model
+
+IDLE = (0, 0, 0, 0)
+
+@cocotb.test()
+async def read_during_write_test(dut):
+    """Each port reads the word it writes, in every RDW mode"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    for ram in RAMS:
+        model = None
+        for p in range(2):
+            requests = [
+                (1, 8, 0x11223344, 0b1111),
+                # Reads back the new word, the old one, or keeps the last read
+                (1, 8, 0xAABBCCDD, 0b1111),
+                (1, 8, 0, 0),
+                # Partial writes: write-first only returns the written bytes
+                (1, 8, 0x55667788, 0b0101),
+                (1, 8, 0x99000000, 0b1000),
+                (1, 9, 0x12345678, 0b0011),
+                (0, 8, 0xFFFFFFFF, 0b1111),
+                (1, 8, 0, 0),
+                (1, 9, 0, 0),
+            ]
+            cycles = [(r, IDLE) if p == 0 else (IDLE, r) for r in requests]
+            model = await run_model(dut, ram, cycles, model)
+
+@cocotb.test()
+async def same_address_test(dut):
+    """Both ports access the same word in the same cycle"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    for ram, (_, _, _, _, policy, _) in RAMS.items():
+        backdoor = MemoryBackdoor(getattr(dut, ram))
+        model = await run_model(dut, ram, [
+            ((1, 4, 0x01020304, 0b1111), IDLE),
+            # One port writes, the other reads the previous contents
+            ((1, 4, 0xA0A0A0A0, 0b1111), (1, 4, 0, 0)),
+            ((1, 4, 0, 0), (1, 4, 0xB0B0B0B0, 0b1111)),
+            # Both write different bytes of the word: both land
+            ((1, 4, 0x0000C1C1, 0b0011), (1, 4, 0xD2D20000, 0b1100)),
+            ((1, 4, 0, 0), (1, 4, 0, 0)),
+            # Both write the same bytes
+            ((1, 5, 0xE3E3E3E3, 0b0110), (1, 5, 0xF4F4F4F4, 0b1111)),
+            ((1, 5, 0, 0), (1, 5, 0, 0)),
+            # Same bytes of different words do not collide
+            ((1, 6, 0x11111111, 0b1111), (1, 7, 0x22222222, 0b1111)),
+            ((1, 6, 0, 0), (1, 7, 0, 0)),
+        ])
+
+        assert backdoor[4] == 0xD2D2C1C1
+        assert backdoor[6] == 0x11111111 and backdoor[7] == 0x22222222
+        if policy == COLLISION_PORT_A:
+            assert backdoor[5] == 0xF4E3E3F4
+        value, unknown = model.word(5)
+        assert unknown == (0 if policy == COLLISION_PORT_A else 0b0110)
+        check_word(f"{ram} word 5", int(backdoor[5]), (value, unknown))
+
+@cocotb.test()
+async def random_read_during_write_test(dut):
+    """Random traffic from both ports on a few words, so they often collide"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    rng = np.random.default_rng(21)
+    for ram in RAMS:
+        count = 5000
+        enables = rng.random((count, 2)) < 0.8
+        addresses = rng.integers(0, 4, (count, 2))
+        data = rng.integers(0, 1 << 32, (count, 2), dtype=np.uint64)
+        # Reads, single bytes and whole words more often than other masks
+        selects = rng.choice([0, 0, 0, 1, 2, 4, 8, 3, 12, 15, 15, 5], (count, 2))
+        requests = [
+            tuple((int(e), int(a), int(d), int(s)) for e, a, d, s in zip(*row))
+            for row in zip(enables, addresses, data, selects)
+        ]
+        model = await run_model(dut, ram, requests)
+
+        backdoor = MemoryBackdoor(getattr(dut, ram))
+        for address in range(4):
+            check_word(f"{ram} word {address}", int(backdoor[address]), model.word(address))
@@ -0,0 +1,156 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, WishboneMaster, idle_bus
+from memutils_tb.initfile import write_init_file
+import random
+import struct
+
+# Firmware images, and the hex files the RAMs of InitFileTest load.
+# They are written when this module is imported, which happens before
+# the simulator runs the RAMs' initial blocks, in the simulation directory.
+
+WB_BASE = 0x80000000
+
+rng = random.Random(0x1F17)
+
+def make_elf(path, segments, is_64):
+    """Minimal little-endian executable, with one loadable program
+    header per (address, data, memory size) segment"""
+    if is_64:
+        header_size, entry_size = 64, 56
+    else:
+        header_size, entry_size = 52, 32
+    data_offset = header_size + entry_size * len(segments)
+
+    headers = b""
+    body = b""
+    for address, data, memory_size in segments:
+        offset = data_offset + len(body)
+        if is_64:
+            headers += struct.pack("<IIQQQQQQ", 1, 5, offset, address, address, len(data), memory_size, 8)
+        else:
+            headers += struct.pack("<IIIIIIII", 1, offset, address, address, len(data), memory_size, 5, 4)
+        body += data
+
+    ident = b"\x7fELF" + bytes([2 if is_64 else 1, 1, 1]) + bytes(9)
+    if is_64:
+        header = struct.pack("<HHIQQQIHHHHHH", 2, 0xF3, 1, 0, header_size, 0, 0,
+                             header_size, entry_size, len(segments), 64, 0, 0)
+    else:
+        header = struct.pack("<HHIIIIIHHHHHH", 2, 0xF3, 1, 0, header_size, 0, 0,
+                             header_size, entry_size, len(segments), 40, 0, 0)
+    with open(path, "wb") as f:
+        f.write(ident + header + headers + body)
+
+def random_bytes(count):
+    return bytes(rng.getrandbits(8) for _ in range(count))
+
+def image(segments, base=0):
+    """{byte offset in the RAM: value}, with .bss zeroed"""
+    contents = {}
+    for address, data, memory_size in segments:
+        for i in range(memory_size):
+            contents[address - base + i] = data[i] if i < len(data) else 0
+    return contents
+
+# Raw binary, not a whole number of words
+SP_IMAGE = random_bytes(3001)
+with open("init_sp.bin", "wb") as f:
+    f.write(SP_IMAGE)
+write_init_file("init_sp.bin", "init_sp.hex", num_col=4, size=4096)
+
+# Same, in 9-bit columns: each byte in the low bits of its column
+SP9_IMAGE = random_bytes(1000)
+with open("init_sp9.bin", "wb") as f:
+    f.write(SP9_IMAGE)
+write_init_file("init_sp9.bin", "init_sp9.hex", num_col=4, col_width=9, size=1024)
+
+# .text, .data with a gap before it, then .bss
+DP_SEGMENTS = [
+    (0x0000, random_bytes(1000), 1000),
+    (0x0800, random_bytes(301), 301 + 200),
+]
+make_elf("init_dp.elf", DP_SEGMENTS, is_64=True)
+write_init_file("init_dp.elf", "init_dp.hex", num_col=8, size=4096)
+
+# Segments out of order in the file, one starting mid-word
+WB_SEGMENTS = [
+    (WB_BASE + 0x400, random_bytes(257), 257),
+    (WB_BASE + 0x000, random_bytes(600), 600),
+    (WB_BASE + 0x6A2, random_bytes(30), 64),
+]
+make_elf("init_wb.elf", WB_SEGMENTS, is_64=False)
+write_init_file("init_wb.elf", "init_wb.hex", num_col=4, size=4096, base=WB_BASE)
+
+WB_DP_IMAGE = random_bytes(8192)
+with open("init_wb_dp.bin", "wb") as f:
+    f.write(WB_DP_IMAGE)
+write_init_file("init_wb_dp.bin", "init_wb_dp.hex", num_col=8, size=8192)
+
+def check_contents(ram, contents, num_col, col_width=8):
+    """Every byte of `contents` is in the RAM, read by backdoor"""
+    words = {}
+    for offset, value in contents.items():
+        words.setdefault(offset // num_col, {})[offset % num_col] = value
+
+    backdoor = MemoryBackdoor(ram)
+    dumped = backdoor.dump()
+    for word, lanes in words.items():
+        got = int(dumped[word])
+        for lane, value in lanes.items():
+            column = (got >> (col_width * lane)) & ((1 << col_width) - 1)
+            assert column == value, \
+                f"Byte {hex(word * num_col + lane)}: expected {hex(value)}, got {hex(column)}"
+
+async def reset(dut):
+    dut.rst.value = 1
+    for port in [dut.sp_port, dut.sp9_port, dut.dp_port_a, dut.dp_port_b]:
+        port.enable.value = 0
+        port.byte_write_enable.value = 0
+        port.address.value = 0
+        port.write_data.value = 0
+    for wb in [dut.wb, dut.wb_a, dut.wb_b]:
+        idle_bus(wb)
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+@cocotb.test()
+async def init_file_test(dut):
+    """Every RAM starts with the contents of its INIT_FILE"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    check_contents(dut.sp_ram, image([(0, SP_IMAGE, len(SP_IMAGE))]), 4)
+    check_contents(dut.sp9_ram, image([(0, SP9_IMAGE, len(SP9_IMAGE))]), 4, col_width=9)
+    check_contents(dut.dp_ram, image(DP_SEGMENTS), 8)
+    check_contents(dut.wb_ram.ram, image(WB_SEGMENTS, WB_BASE), 4)
+    check_contents(dut.wb_dp_ram.ram, image([(0, WB_DP_IMAGE, len(WB_DP_IMAGE))]), 8)
+
+    # Bytes of the padding and of .bss, past the data, are zero
+    assert MemoryBackdoor(dut.sp_ram)[3000 // 4] >> 8 == 0
+    assert MemoryBackdoor(dut.dp_ram)[(0x800 + 301) // 8 + 1] == 0
+
+@cocotb.test()
+async def init_file_bus_test(dut):
+    """Bytes land on the Wishbone lanes of their addresses"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    master = WishboneMaster(dut.clk, dut.wb)
+    contents = image(WB_SEGMENTS, WB_BASE)
+    for address in [0x000, 0x254, 0x400, 0x500, 0x6A0, 0x6C0]:
+        read = await master.read(address)
+        expected = int.from_bytes(bytes(contents.get(address + i, 0) for i in range(4)), "little")
+        assert read.read_data == expected, \
+            f"Address {hex(address)}: expected {hex(expected)}, got {hex(read.read_data)}"
+    master.stop()
+
+    master = WishboneMaster(dut.clk, dut.wb_b, data_width=64)
+    for address in range(0, 8192, 1024):
+        read = await master.read(address)
+        expected = int.from_bytes(WB_DP_IMAGE[address:address + 8], "little")
+        assert read.read_data == expected
+    master.stop()
@@ -0,0 +1,49 @@
+"""Shared cocotb helpers for the memutils benches.
+
+Benches are run by `veryl test`, from a copy of the bench file. The
+Justfile adds `tb/` to PYTHONPATH, so they can `import memutils_tb`.
+
+Helpers are imported from their modules on first use, so that tools
+living in the package, such as the INIT_FILE converter, also run
+where cocotb and numpy are not installed.
+"""
+
+import importlib
+
+# {name: module defining it}
+_EXPORTS = {
+    "BramPortBundle": ".bundle",
+    "MemoryBackdoor": ".backdoor",
+    "MemoryModel": ".model",
+    "ScratchpadReadBundle": ".bundle",
+    "ScratchpadWriteBundle": ".bundle",
+    "Scoreboard": ".model",
+    "SignalBundle": ".bundle",
+    "SparseMemoryModel": ".model",
+    "TrafficGenerator": ".traffic",
+    "TrafficProfile": ".traffic",
+    "WishboneBundle": ".bundle",
+    "WishboneMaster": ".wishbone",
+    "WishboneMonitor": ".monitor",
+    "WishboneSlaveBundle": ".bundle",
+    "WishboneTransaction": ".wishbone",
+    "burst_read": ".wishbone",
+    "byte_mask": ".model",
+    "check_concurrent": ".traffic",
+    "idle_bus": ".wishbone",
+    "single_read": ".wishbone",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
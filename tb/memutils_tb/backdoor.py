@@ -0,0 +1,140 @@
+import re
+
+import numpy as np
+
+# Regions smaller than the memory by this factor are accessed word by
+# word, rather than by going through the whole array
+PARTIAL_ACCESS_RATIO = 16
+
+
+class MemoryBackdoor:
+    """Direct access to the contents of a SinglePortBlockRam,
+    DualPortBlockRam or ScratchpadRam instance, bypassing its ports.
+
+    Bulk operations read and write the whole memory array as a single
+    value, so each call only crosses into the simulator once or twice,
+    whatever the size of the region. Regions much smaller than the
+    memory, and single words read or written by index, only touch the
+    handles of their own words, so large memories stay cheap to access
+    piecemeal.
+
+    ScratchpadRam instances with several write ports keep one replica
+    of the memory per port. Loads write every replica and point the
+    live value table at the first one; reads follow the table.
+    """
+
+    def __init__(self, ram):
+        if hasattr(ram, "g_replicas"):
+            # ScratchpadRam
+            self._arrays = [replica.mem for replica in ram.g_replicas]
+            self._lvt = ram.g_lvt.lvt if len(self._arrays) > 1 else None
+        else:
+            # SinglePortBlockRam, DualPortBlockRam
+            self._arrays = [ram.mem]
+            self._lvt = None
+
+        self.depth = len(self._arrays[0])
+        self.width = len(self._arrays[0][0])
+        self.bytes_per_word = (self.width + 7) // 8
+
+    def __len__(self):
+        return self.depth
+
+    def __getitem__(self, index):
+        replica = int(self._lvt[index].value) if self._lvt is not None else 0
+        return int(self._arrays[replica][index].value)
+
+    def __setitem__(self, index, value):
+        for array in self._arrays:
+            array[index].value = value
+        if self._lvt is not None:
+            self._lvt[index].value = 0
+
+    def _region(self, start, count):
+        if count is None:
+            count = self.depth - start
+        assert 0 <= start and start + count <= self.depth, \
+            f"Region [{start}, {start + count}) out of range for a {self.depth}-word memory"
+        return start, count
+
+    def _read_all(self):
+        values = [[int(word) for word in array.value] for array in self._arrays]
+        if self._lvt is None:
+            return values[0]
+        lvt = [int(replica) for replica in self._lvt.value]
+        return [values[replica][i] for i, replica in enumerate(lvt)]
+
+    def _read_region(self, start, count):
+        if count * PARTIAL_ACCESS_RATIO < self.depth:
+            # Small region of a large memory: word by word
+            return [self[i] for i in range(start, start + count)]
+        return self._read_all()[start:start + count]
+
+    def _write_region(self, start, words):
+        if len(words) * PARTIAL_ACCESS_RATIO < self.depth:
+            for i, word in enumerate(words, start):
+                self[i] = word
+            return
+
+        if start == 0 and len(words) == self.depth:
+            contents = list(words)
+        else:
+            # The simulator only takes whole arrays
+            contents = self._read_all()
+            contents[start:start + len(words)] = words
+
+        for array in self._arrays:
+            array.value = contents
+        if self._lvt is not None:
+            self._lvt.value = [0] * self.depth
+
+    def _to_words(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+            size = self.bytes_per_word
+            # Pad the last word with zeros
+            data += bytes(-len(data) % size)
+            return [int.from_bytes(data[i:i + size], "little") for i in range(0, len(data), size)]
+        if hasattr(data, "tolist"):
+            # NumPy arrays convert to Python ints in one go
+            return [int(word) for word in data.ravel().tolist()]
+        return [int(word) for word in data]
+
+    def load(self, data, start=0):
+        """Write words starting at word `start`. `data` can be bytes,
+        taken as little-endian words, a NumPy array or a list of ints"""
+        words = self._to_words(data)
+        start, _ = self._region(start, len(words))
+        self._write_region(start, words)
+
+    def load_hex(self, path, start=0):
+        """Load a `$readmemh`-style file: whitespace-separated hex words,
+        `@address` directives (in words) and `//` or `/* */` comments"""
+        with open(path) as f:
+            text = f.read()
+        text = re.sub(r"/\*.*?\*/", " ", text, flags=re.S)
+        text = re.sub(r"//[^\n]*", " ", text)
+
+        contents = self._read_all()
+        address = start
+        for token in text.split():
+            if token.startswith("@"):
+                address = start + int(token[1:], 16)
+                continue
+            self._region(address, 1)
+            contents[address] = int(token.replace("_", ""), 16)
+            address += 1
+        self._write_region(0, contents)
+
+    def dump(self, start=0, count=None):
+        """Read words into a NumPy array. Words wider than 64 bits
+        are kept as Python ints, in an array of objects"""
+        start, count = self._region(start, count)
+        words = self._read_region(start, count)
+        dtype = np.uint64 if self.width <= 64 else object
+        return np.array(words, dtype=dtype)
+
+    def fill(self, value=0, start=0, count=None):
+        """Set every word of a region to `value`"""
+        start, count = self._region(start, count)
+        self._write_region(start, [value] * count)
@@ -0,0 +1,97 @@
+class SignalBundle:
+    """The signals of one interface instance, as seen from one side.
+
+    Handles are looked up once, when the bundle is created. `sample`
+    reads every input in a single pass, into a record with one slot
+    per signal, so a bench reads each signal once per cycle however
+    many times it looks at it. Writes are staged with `drive`, then
+    `flush` applies the ones that change a signal's value.
+
+    Sampled values are ints, or None for values with X or Z bits.
+    Skipping unchanged writes assumes the bundle is the only driver
+    of its outputs: call `invalidate` after anything else wrote them.
+    """
+
+    INPUTS = ()
+    OUTPUTS = ()
+
+    def __init__(self, handle):
+        self.handle = handle
+        self._inputs = [(name, getattr(handle, name)) for name in self.INPUTS]
+        self._outputs = {name: getattr(handle, name) for name in self.OUTPUTS}
+        # Last value written to each output
+        self._driven = {}
+        self._staged = {}
+        self._record = type(
+            f"{type(self).__name__}Sample", (), {"__slots__": self.INPUTS}
+        )
+
+    def sample(self):
+        """Read every input, and return them as a record"""
+        record = self._record()
+        for name, signal in self._inputs:
+            value = signal.value
+            setattr(record, name, int(value) if value.is_resolvable else None)
+        return record
+
+    def drive(self, **values):
+        """Stage output values, written on the next `flush`"""
+        self._staged.update(values)
+
+    def flush(self):
+        """Write the staged outputs that changed since they were last written"""
+        for name, value in self._staged.items():
+            if self._driven.get(name) != value:
+                self._outputs[name].value = value
+                self._driven[name] = value
+        self._staged.clear()
+
+    def invalidate(self):
+        """Forget the values last written, so the next flush writes every staged output"""
+        self._driven.clear()
+
+    def write(self, **values):
+        """Stage outputs and write them right away"""
+        self.drive(**values)
+        self.flush()
+
+
+class WishboneBundle(SignalBundle):
+    """A Wishbone bus, driven by a master"""
+
+    INPUTS = ("stall", "ack", "err", "rty", "read_data")
+    OUTPUTS = ("cyc", "stb", "lock", "write_enable", "select", "cti", "bte", "addr", "write_data")
+
+    def idle(self):
+        """Drive every master output to 0"""
+        self.write(**{name: 0 for name in self.OUTPUTS})
+
+
+class WishboneSlaveBundle(SignalBundle):
+    """A Wishbone bus, driven by a slave"""
+
+    INPUTS = WishboneBundle.OUTPUTS
+    OUTPUTS = WishboneBundle.INPUTS
+
+
+class BramPortBundle(SignalBundle):
+    """A BramPort, driven by the RAM's user"""
+
+    INPUTS = ("read_data",)
+    OUTPUTS = ("enable", "address", "write_data", "byte_write_enable")
+
+    def idle(self):
+        self.write(enable=0, address=0, write_data=0, byte_write_enable=0)
+
+
+class ScratchpadReadBundle(SignalBundle):
+    """A ScratchpadRamPort used as a read port"""
+
+    INPUTS = ("data",)
+    OUTPUTS = ("address",)
+
+
+class ScratchpadWriteBundle(SignalBundle):
+    """A ScratchpadRamPort used as a write port"""
+
+    OUTPUTS = ("address", "data", "write_enable")
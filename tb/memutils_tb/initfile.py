@@ -0,0 +1,215 @@
+"""Convert raw binaries and ELF files into INIT_FILE hex files.
+
+The RAMs load INIT_FILE with `$readmemh`: one word per line, in hex,
+with `@address` directives, in words, to skip ahead. Input bytes are
+packed into words of NUM_COL columns of COL_WIDTH bits, one byte per
+column, in the low bits of columns wider than a byte: with the default
+little-endian order, the byte at the lowest address goes to column 0,
+as on the Wishbone byte lanes.
+
+Inputs are streamed, a chunk at a time, so firmware images of any
+size can be converted. ELF files contribute their loadable segments,
+at their physical addresses, with the part of each segment past the
+end of the file (.bss) filled with zeros.
+
+    python -m memutils_tb.initfile firmware.elf -o firmware.hex --num-col 4 --size 65536 --base 0x80000000
+"""
+
+import argparse
+import struct
+
+CHUNK_SIZE = 1 << 16
+
+ELF_MAGIC = b"\x7fELF"
+PT_LOAD = 1
+
+
+class InitFileWriter:
+    """Packs bytes into words, and writes them as a `$readmemh` file.
+
+    Data must be written in increasing address order. Bytes skipped
+    inside a word take `fill`, and whole words skipped are left out,
+    with an `@address` directive to jump over them."""
+
+    def __init__(self, f, num_col=4, col_width=8, depth=None, base=0, endian="little", fill=0):
+        assert col_width >= 8, "Each column holds one byte"
+        assert endian in ("little", "big")
+        self.f = f
+        self.num_col = num_col
+        self.col_width = col_width
+        self.depth = depth
+        self.base = base
+        self.endian = endian
+        self.fill = fill
+        self.digits = (num_col * col_width + 3) // 4
+
+        # Next word to be written in the file, and the bytes of the current one
+        self._next_word = 0
+        self._word = None
+        self._bytes = bytearray()
+
+    def write(self, address, data):
+        """Write `data` at byte `address`, on the memory bus"""
+        offset = address - self.base
+        assert offset >= 0, f"Address {hex(address)} below the memory base {hex(self.base)}"
+        word, lane = divmod(offset, self.num_col)
+        if self._word is not None:
+            current = self._word * self.num_col + len(self._bytes)
+            assert offset >= current, f"Overlapping data at {hex(address)}"
+            if word != self._word:
+                self._flush()
+
+        view = memoryview(data)
+        if self._word is None:
+            self._word = word
+            self._bytes = bytearray([self.fill] * lane)
+        else:
+            self._bytes += bytes([self.fill] * (offset - self._word * self.num_col - len(self._bytes)))
+
+        # Complete the current word, then write whole words in one go
+        head = min(len(view), self.num_col - len(self._bytes))
+        self._bytes += view[:head]
+        view = view[head:]
+        if len(self._bytes) < self.num_col:
+            return
+        self._flush()
+
+        whole = len(view) - len(view) % self.num_col
+        if whole:
+            self._emit(word + 1, view[:whole])
+        if len(view) > whole:
+            self._word = word + 1 + whole // self.num_col
+            self._bytes = bytearray(view[whole:])
+
+    def _flush(self):
+        if self._word is None:
+            return
+        padding = self.num_col - len(self._bytes)
+        self._emit(self._word, bytes(self._bytes) + bytes([self.fill] * padding))
+        self._word = None
+        self._bytes = bytearray()
+
+    def _emit(self, word, data):
+        """Write whole words, starting at `word`"""
+        count = len(data) // self.num_col
+        if self.depth is not None:
+            assert word + count <= self.depth, \
+                f"Data up to word {word + count - 1} does not fit in a {self.depth}-word memory"
+        if word != self._next_word:
+            self.f.write(f"@{word:x}\n")
+
+        step = self.num_col
+        lines = [f"{self._pack(data[i:i + step]):0{self.digits}x}\n" for i in range(0, len(data), step)]
+        self.f.write("".join(lines))
+        self._next_word = word + count
+
+    def _pack(self, columns):
+        """A word from its column bytes, in memory order"""
+        if self.col_width == 8:
+            return int.from_bytes(columns, self.endian)
+        columns = bytes(columns)
+        if self.endian == "big":
+            columns = columns[::-1]
+        word = 0
+        for i, byte in enumerate(columns):
+            word |= byte << (i * self.col_width)
+        return word
+
+    def close(self):
+        self._flush()
+
+
+def binary_chunks(path, address=0):
+    """(address, bytes) chunks of a raw binary, loaded at `address`"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield address, chunk
+            address += len(chunk)
+
+
+def elf_segments(f):
+    """(physical address, file offset, file size, memory size) of the
+    loadable segments of an ELF file, by address"""
+    ident = f.read(16)
+    assert ident[:4] == ELF_MAGIC, "Not an ELF file"
+    is_64 = ident[4] == 2
+    order = "<" if ident[5] == 1 else ">"
+
+    if is_64:
+        header = struct.unpack(order + "HHIQQQIHHHHHH", f.read(48))
+        phoff, phentsize, phnum = header[4], header[8], header[9]
+        entry_format = order + "IIQQQQQQ"
+    else:
+        header = struct.unpack(order + "HHIIIIIHHHHHH", f.read(36))
+        phoff, phentsize, phnum = header[4], header[8], header[9]
+        entry_format = order + "IIIIIIII"
+
+    segments = []
+    for i in range(phnum):
+        f.seek(phoff + i * phentsize)
+        entry = struct.unpack(entry_format, f.read(struct.calcsize(entry_format)))
+        if is_64:
+            p_type, _, p_offset, _, p_paddr, p_filesz, p_memsz, _ = entry
+        else:
+            p_type, p_offset, _, p_paddr, p_filesz, p_memsz, _, _ = entry
+        if p_type == PT_LOAD and p_memsz > 0:
+            segments.append((p_paddr, p_offset, p_filesz, p_memsz))
+    return sorted(segments)
+
+
+def elf_chunks(path):
+    """(address, bytes) chunks of the loadable segments of an ELF file"""
+    with open(path, "rb") as f:
+        for address, offset, file_size, memory_size in elf_segments(f):
+            f.seek(offset)
+            done = 0
+            while done < file_size:
+                chunk = f.read(min(CHUNK_SIZE, file_size - done))
+                assert chunk, "Truncated ELF segment"
+                yield address + done, chunk
+                done += len(chunk)
+            # .bss
+            while done < memory_size:
+                size = min(CHUNK_SIZE, memory_size - done)
+                yield address + done, bytes(size)
+                done += size
+
+
+def is_elf(path):
+    with open(path, "rb") as f:
+        return f.read(4) == ELF_MAGIC
+
+
+def write_init_file(source, path, num_col=4, col_width=8, size=None, base=0, endian="little", fill=0):
+    """Convert a raw binary or an ELF file into a `$readmemh` file for a
+    RAM of NUM_COL columns of COL_WIDTH bits, and `size` bytes if given,
+    mapped at `base` on the bus. Raw binaries are loaded at `base`"""
+    depth = None if size is None else size // num_col
+    chunks = elf_chunks(source) if is_elf(source) else binary_chunks(source, base)
+    with open(path, "w") as f:
+        writer = InitFileWriter(f, num_col, col_width, depth, base, endian, fill)
+        for address, chunk in chunks:
+            writer.write(address, chunk)
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a raw binary or an ELF file into an INIT_FILE hex file")
+    parser.add_argument("source", help="raw binary, or ELF file")
+    parser.add_argument("-o", "--output", required=True, help="hex file to write")
+    parser.add_argument("--num-col", type=int, default=4, help="NUM_COL of the RAM, bytes per word")
+    parser.add_argument("--col-width", type=int, default=8, help="COL_WIDTH of the RAM, bits per column")
+    parser.add_argument("--size", type=lambda s: int(s, 0), help="RAM size in bytes, to check the data fits")
+    parser.add_argument("--base", type=lambda s: int(s, 0), default=0, help="address of the RAM on the bus")
+    parser.add_argument("--endian", choices=["little", "big"], default="little", help="byte order within words")
+    parser.add_argument("--fill", type=lambda s: int(s, 0), default=0, help="value of padding bytes")
+    args = parser.parse_args()
+
+    write_init_file(args.source, args.output, args.num_col, args.col_width, args.size, args.base, args.endian, args.fill)
+
+
+if __name__ == "__main__":
+    main()
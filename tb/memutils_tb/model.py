@@ -0,0 +1,273 @@
+import numpy as np
+
+
+def byte_mask(select, num_bytes=4):
+    """Bit mask covering the bytes enabled by `select`"""
+    mask = 0
+    for j in range(num_bytes):
+        if (select >> j) & 1:
+            mask |= 0xFF << (j * 8)
+    return mask
+
+
+def pack_words(data, bytes_per_word):
+    """Little-endian words from a NumPy array of bytes"""
+    lanes = data.reshape(-1, bytes_per_word).astype(np.uint64)
+    shifts = 8 * np.arange(bytes_per_word, dtype=np.uint64)
+    return (lanes << shifts).sum(axis=1, dtype=np.uint64)
+
+
+class MemoryModel:
+    """Golden model of a byte-addressed memory with byte enables.
+
+    Contents are kept as a NumPy array of bytes. Writes can be applied
+    one at a time, or in bulk from arrays of addresses, data and
+    select bits, in which case later writes win over earlier ones, as
+    they would on the bus. Words are up to 64 bits wide.
+
+    Bytes can also be marked as unknown, for instance after two ports
+    wrote them in the same cycle. Unknown bytes are left out of
+    comparisons until they are written again.
+    """
+
+    def __init__(self, size, data_width=32):
+        assert data_width % 8 == 0 and data_width <= 64
+        self.size = size
+        self.bytes_per_word = data_width // 8
+        self.data = np.zeros(size, dtype=np.uint8)
+        self.known = np.ones(size, dtype=bool)
+
+        self._lanes = np.arange(self.bytes_per_word, dtype=np.uint64)
+
+    def __len__(self):
+        return self.size // self.bytes_per_word
+
+    # Storage, overridden by SparseMemoryModel. Offsets and targets are byte addresses
+
+    def _store(self, targets, values):
+        self.data[targets] = values
+        self.known[targets] = True
+
+    def _forget(self, targets):
+        self.known[targets] = False
+
+    def _get(self, offset, count):
+        """(bytes, known) of a range"""
+        return self.data[offset:offset + count], self.known[offset:offset + count]
+
+    def _set(self, offset, values):
+        self.data[offset:offset + values.size] = values
+        self.known[offset:offset + values.size] = True
+
+    def regions(self):
+        """(byte address, bytes, known) of every region holding data"""
+        yield 0, self.data, self.known
+
+    # Accesses
+
+    def _word_bytes(self, words):
+        return ((words[:, None] >> (8 * self._lanes)) & 0xFF).astype(np.uint8).ravel()
+
+    def write(self, address, data, select=None):
+        self.write_many([address], [data], None if select is None else [select])
+
+    def write_many(self, addresses, data, selects=None):
+        """Apply writes in order. `addresses` are byte addresses of
+        aligned words, `selects` defaults to every byte enabled"""
+        addresses = np.asarray(addresses, dtype=np.int64)
+        data = np.asarray(data, dtype=np.uint64)
+        if selects is None:
+            selects = np.full(addresses.shape, (1 << self.bytes_per_word) - 1, dtype=np.uint64)
+        selects = np.asarray(selects, dtype=np.uint64)
+        assert np.all(addresses % self.bytes_per_word == 0), "Misaligned address"
+
+        # One row per write, one column per byte lane
+        enabled = ((selects[:, None] >> self._lanes) & 1).astype(bool)
+        values = ((data[:, None] >> (8 * self._lanes)) & 0xFF).astype(np.uint8)
+        targets = addresses[:, None] + self._lanes.astype(np.int64)
+
+        targets = targets[enabled]
+        values = values[enabled]
+
+        # Keep the last write to each byte
+        reversed_targets = targets[::-1]
+        _, last = np.unique(reversed_targets, return_index=True)
+        self._store(reversed_targets[last], values[::-1][last])
+
+    def invalidate(self, address, select=None):
+        """Mark the bytes enabled by `select` in the word at `address` as unknown"""
+        if select is None:
+            select = (1 << self.bytes_per_word) - 1
+        lanes = [lane for lane in range(self.bytes_per_word) if (select >> lane) & 1]
+        self._forget(np.array(lanes, dtype=np.int64) + address)
+
+    def fill(self, value=0, start=0, count=None):
+        """Set every word of a region, in words, to `value`"""
+        if count is None:
+            count = len(self) - start
+        pattern = self._word_bytes(np.array([value], dtype=np.uint64))
+        self._set(start * self.bytes_per_word, np.tile(pattern, count))
+
+    def load(self, words, start=0):
+        """Overwrite words, starting at word `start`"""
+        words = np.asarray(words, dtype=np.uint64).ravel()
+        self._set(start * self.bytes_per_word, self._word_bytes(words))
+
+    def read(self, address):
+        data, _ = self._get(address, self.bytes_per_word)
+        return int.from_bytes(data.tobytes(), "little")
+
+    def known_mask(self, address):
+        """Bit mask of the known bytes of the word at `address`"""
+        _, known = self._get(address, self.bytes_per_word)
+        return int.from_bytes(np.where(known, 0xFF, 0).astype(np.uint8).tobytes(), "little")
+
+    def words(self):
+        """Contents as a NumPy array of words"""
+        data, _ = self._get(0, self.size)
+        return pack_words(data, self.bytes_per_word)
+
+    def known_masks(self):
+        """Bit masks of the known bytes of every word, as a NumPy array"""
+        _, known = self._get(0, self.size)
+        return pack_words(np.where(known, 0xFF, 0).astype(np.uint8), self.bytes_per_word)
+
+
+class SparseMemoryModel(MemoryModel):
+    """MemoryModel for large memories, allocated a page at a time.
+
+    Pages are only allocated when they are first written, so the cost
+    of the model follows the amount of data the bench touches, not the
+    size of the memory. Bytes that were never written are unknown: the
+    model makes no assumption on what an uncleared RAM holds, and reads
+    them back as 0. `regions` only goes over allocated pages.
+    """
+
+    def __init__(self, size, data_width=32, page_size=4096):
+        assert data_width % 8 == 0 and data_width <= 64
+        assert page_size % (data_width // 8) == 0
+        self.size = size
+        self.bytes_per_word = data_width // 8
+        self.page_size = page_size
+        # {page index: (bytes, known)}
+        self.pages = {}
+
+        self._lanes = np.arange(self.bytes_per_word, dtype=np.uint64)
+
+    def _page(self, index):
+        page = self.pages.get(index)
+        if page is None:
+            page = (np.zeros(self.page_size, dtype=np.uint8), np.zeros(self.page_size, dtype=bool))
+            self.pages[index] = page
+        return page
+
+    def _by_page(self, targets):
+        """Split byte addresses by page: (page index, offsets in the page, positions in `targets`)"""
+        pages = targets // self.page_size
+        order = np.argsort(pages, kind="stable")
+        indexes, starts = np.unique(pages[order], return_index=True)
+        for index, positions in zip(indexes.tolist(), np.split(order, starts[1:])):
+            yield index, targets[positions] % self.page_size, positions
+
+    def _store(self, targets, values):
+        for index, offsets, positions in self._by_page(targets):
+            data, known = self._page(index)
+            data[offsets] = values[positions]
+            known[offsets] = True
+
+    def _forget(self, targets):
+        for index, offsets, _ in self._by_page(targets):
+            if index in self.pages:
+                self.pages[index][1][offsets] = False
+
+    def _spans(self, offset, count):
+        """(page index, start in the page, start in the range, length) of the pages a range covers"""
+        end = offset + count
+        first, last = offset // self.page_size, (end - 1) // self.page_size
+        if last - first + 1 > len(self.pages):
+            # Large range: only visit the pages that exist
+            indexes = sorted(i for i in self.pages if first <= i <= last)
+        else:
+            indexes = range(first, last + 1)
+        for index in indexes:
+            page_start = index * self.page_size
+            start = max(offset, page_start)
+            stop = min(end, page_start + self.page_size)
+            yield index, start - page_start, start - offset, stop - start
+
+    def _get(self, offset, count):
+        data = np.zeros(count, dtype=np.uint8)
+        known = np.zeros(count, dtype=bool)
+        for index, page_offset, range_offset, length in self._spans(offset, count):
+            if index in self.pages:
+                page_data, page_known = self.pages[index]
+                data[range_offset:range_offset + length] = page_data[page_offset:page_offset + length]
+                known[range_offset:range_offset + length] = page_known[page_offset:page_offset + length]
+        return data, known
+
+    def _set(self, offset, values):
+        # Every page of the range is written, allocated or not
+        end = offset + values.size
+        for index in range(offset // self.page_size, (end - 1) // self.page_size + 1):
+            page_start = index * self.page_size
+            start = max(offset, page_start)
+            stop = min(end, page_start + self.page_size)
+            data, known = self._page(index)
+            data[start - page_start:stop - page_start] = values[start - offset:stop - offset]
+            known[start - page_start:stop - page_start] = True
+
+    def regions(self):
+        for index in sorted(self.pages):
+            data, known = self.pages[index]
+            yield index * self.page_size, data, known
+
+    def clear(self):
+        """Forget every page, making the whole memory unknown again"""
+        self.pages.clear()
+
+    @property
+    def allocated(self):
+        """Bytes allocated to pages"""
+        return len(self.pages) * self.page_size
+
+
+class Scoreboard:
+    """Compares the memory image of a DUT with a MemoryModel.
+
+    Every region of the model is dumped through a MemoryBackdoor and
+    diffed in one vectorized comparison, so a SparseMemoryModel only
+    reads back the pages it holds. Bytes the model does not know are
+    not compared."""
+
+    def __init__(self, model, backdoor, max_report=8):
+        assert len(model) == len(backdoor), \
+            f"Model holds {len(model)} words, DUT memory {len(backdoor)}"
+        self.model = model
+        self.backdoor = backdoor
+        self.max_report = max_report
+
+    def check(self):
+        bytes_per_word = self.model.bytes_per_word
+
+        count = 0
+        mismatches = []
+        for address, data, known in self.model.regions():
+            start = address // bytes_per_word
+            mask = pack_words(np.where(known, 0xFF, 0).astype(np.uint8), bytes_per_word)
+            expected = pack_words(data, bytes_per_word) & mask
+            actual = self.backdoor.dump(start, mask.size) & mask
+            different = np.flatnonzero(actual != expected)
+            count += different.size
+            for i in different[:self.max_report - len(mismatches)].tolist():
+                mismatches.append((start + i, int(expected[i]), int(actual[i])))
+        if count == 0:
+            return
+
+        width = 2 * bytes_per_word
+        lines = [
+            f"  {hex(i * bytes_per_word)}: expected {expected:0{width}x}, got {actual:0{width}x}"
+            for i, expected, actual in mismatches[:self.max_report]
+        ]
+        raise AssertionError(
+            f"{count} mismatching words, first ones:\n" + "\n".join(lines)
+        )
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+from collections import Counter, deque
+
+import cocotb
+from cocotb.triggers import RisingEdge
+
+
+class WishboneMonitor:
+    """Passive monitor for a Wishbone bus, in pipelined mode.
+
+    Never drives the bus. Requests are counted on the edges where CYC,
+    STB are high and STALL is low, and matched in order with ACK, ERR
+    or RTY, to measure latency in cycles. Requests still in flight when
+    CYC drops are counted as aborted.
+
+    Only CYC is read while the bus is idle, and only the handshake
+    signals while it is busy, so monitors can stay attached during long
+    regressions. Pass `keep_transactions` to also record the address,
+    direction and data of every transaction, in `transactions`.
+
+    Statistics are reset by `clear`, and reported by `report`. When the
+    MEMUTILS_MONITOR_OUTPUT environment variable is set, `report` also
+    appends its summary to that file, one JSON object per line.
+    """
+
+    def __init__(self, clk, wb, name=None, keep_transactions=False):
+        self.clk = clk
+        self.name = name or wb._name
+        self.keep_transactions = keep_transactions
+        self.log = logging.getLogger(f"cocotb.monitor.{self.name}")
+
+        self._cyc = wb.cyc
+        self._stb = wb.stb
+        self._stall = wb.stall
+        self._ack = wb.ack
+        self._err = wb.err
+        self._rty = wb.rty
+        self._write_enable = wb.write_enable
+        if keep_transactions:
+            self._addr = wb.addr
+            self._select = wb.select
+            self._write_data = wb.write_data
+            self._read_data = wb.read_data
+
+        self.clear()
+        self._task = cocotb.start_soon(self._run())
+
+    def clear(self):
+        self.cycles = 0
+        # CYC low
+        self.idle_cycles = 0
+        # CYC high
+        self.busy_cycles = 0
+        # STB high, held by STALL
+        self.stall_cycles = 0
+        self.reads = 0
+        self.writes = 0
+        self.acks = 0
+        self.errs = 0
+        self.rtys = 0
+        self.aborted = 0
+        # {latency in cycles: responses}
+        self.latencies = Counter()
+        self.transactions = []
+        self._in_flight = deque()
+
+    def stop(self):
+        self._task.kill()
+
+    async def _run(self):
+        clk = RisingEdge(self.clk)
+        while True:
+            await clk
+            self._sample()
+
+    def _sample(self):
+        self.cycles += 1
+        cyc = self._cyc.value
+        if not cyc.is_resolvable or cyc == 0:
+            self.idle_cycles += 1
+            if self._in_flight:
+                self.aborted += len(self._in_flight)
+                self._in_flight.clear()
+            return
+        self.busy_cycles += 1
+
+        if self._stb.value == 1:
+            if self._stall.value == 1:
+                self.stall_cycles += 1
+            else:
+                self._request()
+
+        ack = self._ack.value == 1
+        err = self._err.value == 1
+        rty = self._rty.value == 1
+        if ack or err or rty:
+            self._response(ack, err, rty)
+
+    def _request(self):
+        write = self._write_enable.value == 1
+        if write:
+            self.writes += 1
+        else:
+            self.reads += 1
+        transaction = {"issue_cycle": self.cycles, "write": write}
+        if self.keep_transactions:
+            transaction["address"] = int(self._addr.value)
+            transaction["select"] = int(self._select.value)
+            if write:
+                transaction["data"] = int(self._write_data.value)
+            self.transactions.append(transaction)
+        self._in_flight.append(transaction)
+
+    def _response(self, ack, err, rty):
+        self.acks += ack
+        self.errs += err
+        self.rtys += rty
+        if not self._in_flight:
+            self.log.warning(f"Response without a request in flight, in cycle {self.cycles}")
+            return
+        transaction = self._in_flight.popleft()
+        self.latencies[self.cycles - transaction["issue_cycle"]] += 1
+        if self.keep_transactions:
+            transaction["response_cycle"] = self.cycles
+            transaction["status"] = "ack" if ack else "err" if err else "rty"
+            if ack and not transaction["write"]:
+                read_data = self._read_data.value
+                transaction["data"] = int(read_data) if read_data.is_resolvable else None
+
+    @property
+    def requests(self):
+        return self.reads + self.writes
+
+    def summary(self):
+        """Statistics since the last `clear`, as a dict"""
+        responses = sum(self.latencies.values())
+        return {
+            "name": self.name,
+            "cycles": self.cycles,
+            "idle_cycles": self.idle_cycles,
+            "busy_cycles": self.busy_cycles,
+            "stall_cycles": self.stall_cycles,
+            "reads": self.reads,
+            "writes": self.writes,
+            "acks": self.acks,
+            "errs": self.errs,
+            "rtys": self.rtys,
+            "aborted": self.aborted,
+            # Requests accepted per cycle, 1.0 for a request every cycle
+            "utilization": self.requests / self.cycles if self.cycles else 0.0,
+            "mean_latency": sum(l * n for l, n in self.latencies.items()) / responses if responses else None,
+            "latency_histogram": {str(l): n for l, n in sorted(self.latencies.items())},
+        }
+
+    def report(self):
+        """Log the summary, and append it to MEMUTILS_MONITOR_OUTPUT if set. Returns it"""
+        summary = self.summary()
+        histogram = ", ".join(f"{l}: {n}" for l, n in summary["latency_histogram"].items())
+        mean_latency = summary["mean_latency"]
+        self.log.info(
+            f"{summary['cycles']} cycles, {summary['idle_cycles']} idle, {summary['stall_cycles']} stalled, "
+            f"{summary['reads']} reads, {summary['writes']} writes, {summary['errs']} errors, "
+            f"{summary['aborted']} aborted, utilization {summary['utilization']:.3f}, "
+            f"mean latency {'-' if mean_latency is None else f'{mean_latency:.2f}'} "
+            f"(latency: responses {{{histogram}}})"
+        )
+
+        path = os.environ.get("MEMUTILS_MONITOR_OUTPUT")
+        if path:
+            with open(path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+        return summary
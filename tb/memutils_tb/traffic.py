@@ -0,0 +1,137 @@
+import random
+from collections import defaultdict
+
+from cocotb.triggers import RisingEdge
+
+from .model import byte_mask
+from .wishbone import WishboneTransaction
+
+
+class TrafficProfile:
+    """Knobs for constrained-random Wishbone traffic.
+
+    - `injection_rate`: probability of offering a new request on a
+      given cycle, 1.0 for back-to-back requests
+    - `read_fraction`: probability of a request being a read
+    - `selects`: {select: weight} for writes, full words by default.
+      Reads always select every byte
+    - `words`: range of word indexes the requests stay in
+    - `sequential`: probability of accessing the word right after the
+      previous one, rather than a random one, for address locality
+    - `hot_words` and `hot_fraction`: a range of words, usually shared
+      with other ports, and the probability of a request going there,
+      to provoke collisions
+    """
+
+    def __init__(self, words, injection_rate=1.0, read_fraction=0.5, selects=None,
+                 sequential=0.0, hot_words=None, hot_fraction=0.0):
+        assert 0 < injection_rate <= 1
+        self.words = words
+        self.injection_rate = injection_rate
+        self.read_fraction = read_fraction
+        self.selects = selects
+        self.sequential = sequential
+        self.hot_words = hot_words
+        self.hot_fraction = hot_fraction
+
+
+class TrafficGenerator:
+    """Drives a WishboneMaster with traffic following a TrafficProfile.
+
+    Requests are drawn from a seeded generator, so a run can be
+    reproduced from its seed."""
+
+    def __init__(self, master, profile, seed=0):
+        self.master = master
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.transactions = []
+
+        self._word = profile.words.start
+        self._word_bytes = master.data_width // 8
+
+    def _next_word(self):
+        profile = self.profile
+        if profile.hot_words is not None and self.rng.random() < profile.hot_fraction:
+            return self.rng.choice(profile.hot_words)
+        if self.rng.random() < profile.sequential:
+            word = self._word + 1
+            return word if word in profile.words else profile.words.start
+        return self.rng.choice(profile.words)
+
+    def _next_select(self):
+        selects = self.profile.selects
+        if selects is None:
+            return self.master.full_select
+        return self.rng.choices(list(selects), weights=list(selects.values()))[0]
+
+    def next_transaction(self):
+        self._word = self._next_word()
+        address = self._word * self._word_bytes
+        if self.rng.random() < self.profile.read_fraction:
+            return WishboneTransaction(address, False, 0, self.master.full_select)
+        data = self.rng.getrandbits(self.master.data_width)
+        return WishboneTransaction(address, True, data, self._next_select())
+
+    async def run(self, count):
+        """Offer `count` requests at the injection rate, and wait for their
+        responses. Returns the transactions, in order"""
+        transactions = []
+        while len(transactions) < count:
+            if self.rng.random() < self.profile.injection_rate:
+                transactions.append(self.master.submit(self.next_transaction()))
+            await RisingEdge(self.master.clk)
+        await self.master.wait_idle()
+        self.transactions += transactions
+        return transactions
+
+    def bandwidth(self, transactions=None):
+        """(transactions per cycle, bytes per cycle), from the first
+        request accepted to the last response"""
+        if transactions is None:
+            transactions = self.transactions
+        cycles = transactions[-1].response_cycle - transactions[0].issue_cycle + 1
+        num_bytes = sum(bin(t.select).count("1") for t in transactions)
+        return len(transactions) / cycles, num_bytes / cycles
+
+
+def check_concurrent(model, ports):
+    """Check transactions issued on several ports of the same memory
+    against `model`, then leave the model holding the final contents.
+
+    `ports` holds one list of transactions per port. Their master cycle
+    counts must line up, which is the case for masters sharing a clock
+    and created at the same time. Transactions take effect in the cycle
+    they are issued, as on the dual-port RAMs. Within a cycle:
+
+    - reads return the contents from before the cycle's writes, so a
+      read colliding with a write on another port returns the old data
+    - bytes written by a single port take its data
+    - bytes written by several ports are unknown until written again,
+      and are not checked
+    """
+    cycles = defaultdict(list)
+    for transactions in ports:
+        for transaction in transactions:
+            assert transaction.ack and not transaction.err, transaction
+            cycles[transaction.issue_cycle].append(transaction)
+
+    for cycle in sorted(cycles):
+        transactions = cycles[cycle]
+        for transaction in transactions:
+            if transaction.write:
+                continue
+            known = model.known_mask(transaction.address) & byte_mask(transaction.select, model.bytes_per_word)
+            expected = model.read(transaction.address) & known
+            got = transaction.read_data & known
+            assert got == expected, \
+                f"Read of {hex(transaction.address)} in cycle {cycle}: expected {hex(expected)}, got {hex(got)}"
+
+        writes = [t for t in transactions if t.write]
+        for transaction in writes:
+            model.write(transaction.address, transaction.data, transaction.select)
+        # Bytes written by more than one port in this cycle
+        for i, first in enumerate(writes):
+            for second in writes[i + 1:]:
+                if first.address == second.address and first.select & second.select:
+                    model.invalidate(first.address, first.select & second.select)
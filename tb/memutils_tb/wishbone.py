@@ -0,0 +1,241 @@
+from collections import deque
+
+import cocotb
+from cocotb.triggers import Event, RisingEdge
+
+from .bundle import WishboneBundle
+
+# Wishbone B4 cycle type identifiers
+CTI_CLASSIC = 0b000
+CTI_INCR = 0b010
+CTI_END = 0b111
+
+
+def idle_bus(wb):
+    """Drive every master output of a Wishbone bus to 0"""
+    wb.cyc.value = 0
+    wb.stb.value = 0
+    wb.lock.value = 0
+    wb.write_enable.value = 0
+    wb.select.value = 0
+    wb.cti.value = 0
+    wb.bte.value = 0
+    wb.addr.value = 0
+    wb.write_data.value = 0
+
+
+class WishboneTransaction:
+    """A single Wishbone request, and its response once it is back.
+
+    Awaiting a transaction waits for its response, and returns the
+    transaction itself."""
+
+    def __init__(self, address, write, data=0, select=None):
+        self.address = address
+        self.write = write
+        self.data = data
+        self.select = select
+
+        # Filled in when the response comes back
+        self.ack = False
+        self.err = False
+        self.read_data = None
+        # Cycles counted by the master when the request was
+        # accepted, and when its response came back
+        self.issue_cycle = None
+        self.response_cycle = None
+
+        # Set once queued on a master, which issues a transaction only once
+        self._submitted = False
+        self._done = Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def latency(self):
+        return self.response_cycle - self.issue_cycle
+
+    def __await__(self):
+        if not self._done.is_set():
+            yield from self._done.wait().__await__()
+        return self
+
+    def __repr__(self):
+        kind = "write" if self.write else "read"
+        return f"WishboneTransaction({kind} {hex(self.address)}, ack={self.ack}, err={self.err})"
+
+
+class WishboneMaster:
+    """Pipelined Wishbone B4 master.
+
+    Transactions are queued, then issued one per cycle while STALL is
+    low. ACK and ERR are matched to requests in order, so any number of
+    transactions can be in flight. CYC is held for as long as there
+    are queued or outstanding transactions, and dropped once the last
+    response is back.
+
+    Every signal is sampled right after the rising edge, so the values
+    read are the ones the slave saw on that edge. The bus is accessed
+    through a WishboneBundle: inputs are sampled once per cycle, and
+    only outputs that change are written. Other code may drive the bus
+    while the master is idle.
+    """
+
+    def __init__(self, clk, wb, data_width=32):
+        self.clk = clk
+        self.wb = wb
+        self.data_width = data_width
+        self.full_select = (1 << (data_width // 8)) - 1
+
+        # Cycles since the master was created
+        self.cycle = 0
+
+        self._queue = deque()
+        self._in_flight = deque()
+        self._idle = Event()
+        self._idle.set()
+
+        self.bus = WishboneBundle(wb)
+        self.bus.idle()
+        self._driver = cocotb.start_soon(self._run())
+
+    def submit(self, transaction):
+        """Queue a transaction without waiting for it"""
+        assert not transaction._submitted, f"{transaction} was already submitted"
+        transaction._submitted = True
+        if transaction.select is None:
+            transaction.select = self.full_select
+        if self._idle.is_set():
+            # The bus may have been driven by someone else in the meantime
+            self.bus.invalidate()
+        self._queue.append(transaction)
+        self._idle.clear()
+        return transaction
+
+    def read(self, address, select=None):
+        """Queue a read. Await the result to get the transaction back"""
+        return self.submit(WishboneTransaction(address, False, 0, select))
+
+    def write(self, address, data, select=None):
+        """Queue a write. Await the result to get the transaction back"""
+        return self.submit(WishboneTransaction(address, True, data, select))
+
+    async def run(self, transactions):
+        """Queue every transaction at once, and wait for all of them.
+        Takes new WishboneTransactions, not the ones `read` and `write`
+        already queued"""
+        transactions = [self.submit(t) for t in transactions]
+        await self.wait_idle()
+        return transactions
+
+    async def responses(self, transactions):
+        """Queue every new transaction at once, and yield them as their responses come back"""
+        transactions = [self.submit(t) for t in transactions]
+        for transaction in transactions:
+            yield await transaction
+
+    async def wait_idle(self):
+        """Wait until every queued transaction is back"""
+        await self._idle.wait()
+
+    def stop(self):
+        self._driver.kill()
+        idle_bus(self.wb)
+
+    def _drive(self):
+        bus = self.bus
+        if self._queue:
+            transaction = self._queue[0]
+            bus.drive(
+                cyc=1,
+                stb=1,
+                write_enable=int(transaction.write),
+                select=transaction.select,
+                addr=transaction.address,
+                write_data=transaction.data,
+            )
+        else:
+            bus.drive(stb=0, cyc=int(bool(self._in_flight)))
+        bus.flush()
+
+    async def _run(self):
+        clk = RisingEdge(self.clk)
+        while True:
+            self._drive()
+            # STB as driven for this edge
+            requesting = bool(self._queue)
+            await clk
+            self.cycle += 1
+            sample = self.bus.sample()
+
+            if requesting and sample.stall == 0:
+                transaction = self._queue.popleft()
+                transaction.issue_cycle = self.cycle
+                self._in_flight.append(transaction)
+
+            if sample.ack == 1 or sample.err == 1:
+                assert self._in_flight, "Response without a request in flight"
+                transaction = self._in_flight.popleft()
+                transaction.ack = sample.ack == 1
+                transaction.err = sample.err == 1
+                transaction.read_data = sample.read_data
+                transaction.response_cycle = self.cycle
+                transaction._done.set()
+
+            if not self._queue and not self._in_flight:
+                self._idle.set()
+
+
+async def single_read(clk, wb, address):
+    """Single read inside the current bus cycle. Returns the read data,
+    and leaves CYC high"""
+    wb.stb.value = 1
+    wb.write_enable.value = 0
+    wb.select.value = 0b1111
+    wb.cti.value = CTI_CLASSIC
+    wb.addr.value = address
+
+    for _ in range(16):
+        await RisingEdge(clk)
+        if wb.stall.value == 0:
+            break
+    else:
+        assert False, f"Read at {hex(address)} stalled"
+    wb.stb.value = 0
+
+    for _ in range(16):
+        await RisingEdge(clk)
+        assert wb.err.value == 0
+        if wb.ack.value == 1:
+            return int(wb.read_data.value)
+    assert False, f"Read at {hex(address)} not acknowledged"
+
+
+async def burst_read(clk, wb, address, words):
+    """Registered feedback incrementing burst inside the current bus
+    cycle. Returns the read data, and leaves CYC high"""
+    data = []
+    wb.stb.value = 1
+    wb.write_enable.value = 0
+    wb.select.value = 0b1111
+    wb.cti.value = CTI_INCR
+    wb.addr.value = address
+
+    for _ in range(4 * words):
+        await RisingEdge(clk)
+        assert wb.err.value == 0
+        if wb.ack.value == 1:
+            data.append(int(wb.read_data.value))
+            if len(data) == words:
+                break
+            address += 4
+            wb.addr.value = address
+            wb.cti.value = CTI_END if len(data) == words - 1 else CTI_INCR
+    else:
+        assert False, f"Burst at {hex(address)} stalled"
+
+    wb.stb.value = 0
+    wb.cti.value = CTI_CLASSIC
+    return data
@@ -0,0 +1,272 @@
+"""Regression runner for the cocotb benches.
+
+Runs the benches of src/tests/*.veryl through the cocotb runner
+instead of `veryl test`. Verilator models are cached by test top,
+parameters and sources, so each one is built once, however many
+benches, seeds and sweeps run against it. Builds and bench runs are
+spread over every core.
+
+    python tb/regress.py                           # every bench, seed 0
+    python tb/regress.py wb_ram wb_dp_ram --seeds 8  # names as in `just t`
+    python tb/regress.py sp_bram --sweep RAM_DEPTH=1024,4096 --sweep DATA_WIDTH=32,64
+    python tb/regress.py wb_ram --sweep SIZE=256,65536
+
+Sweeps set parameters of the test tops, such as SIZE of the wb_ram
+top, or RAM_DEPTH and DATA_WIDTH of the sp_bram top. Each top runs
+the product of every --sweep over the parameters it declares. Results go to
+target/regress/results.json and target/regress/results.xml (JUnit).
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from cocotb_tools.runner import get_runner
+except ImportError:
+    # cocotb < 2.0
+    from cocotb.runner import get_runner
+
+ROOT = Path(__file__).resolve().parents[1]
+TB_DIR = ROOT / "tb"
+TESTS_DIR = ROOT / "src" / "tests"
+SV_DIR = ROOT / "target"
+OUTPUT_DIR = SV_DIR / "regress"
+
+# Veryl prefixes generated modules with the project name
+MODULE_PREFIX = "memutils_"
+
+TEST_PATTERN = re.compile(r'#\[test\((\w+),\s*(\w+)\)\]\s*include\s*\(\s*cocotb\s*,\s*"([^"]+)"\s*\)')
+PARAMS_PATTERN = re.compile(r'module\s+(\w+)\s*#\((.*?)\)\s*\(', re.DOTALL)
+
+
+def discover_tests():
+    """{test name: (top module, bench module, parameter names)}, from
+    the #[test] attributes and module headers of src/tests"""
+    tests = {}
+    for path in sorted(TESTS_DIR.glob("*.veryl")):
+        text = path.read_text()
+        params = {top: set(re.findall(r'param\s+(\w+)', header)) for top, header in PARAMS_PATTERN.findall(text)}
+        for name, top, bench in TEST_PATTERN.findall(text):
+            tests[name.removeprefix("test_")] = (top, Path(bench).stem, params.get(top, set()))
+    return tests
+
+
+def sources():
+    """Generated SystemVerilog, packages first"""
+    files = sorted(SV_DIR.glob("**/*.sv"))
+    files = [f for f in files if OUTPUT_DIR not in f.parents]
+    return sorted(files, key=lambda f: not f.stem.endswith("_pkg"))
+
+
+def model_key(top, params, files, waves):
+    digest = hashlib.sha1()
+    digest.update(top.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(b"waves" if waves else b"")
+    for f in files:
+        digest.update(f.read_bytes())
+    return f"{top}-{digest.hexdigest()[:12]}"
+
+
+def build(top, params, files, build_dir, waves):
+    """Build a Verilator model, unless it is already in `build_dir`. Returns the build time"""
+    if (build_dir / "done").exists():
+        return 0.0
+    start = time.perf_counter()
+    runner = get_runner("verilator")
+    runner.build(
+        sources=files,
+        hdl_toplevel=MODULE_PREFIX + top,
+        parameters=params,
+        build_dir=build_dir,
+        waves=waves,
+        timescale=("1ns", "1ps"),
+        build_args=["-Wno-fatal"],
+        always=True,
+    )
+    (build_dir / "done").touch()
+    return time.perf_counter() - start
+
+
+def run(job):
+    """Run one bench on one model, with one seed. Returns its results"""
+    top, bench, params, seed, build_dir, test_dir, waves = job
+    test_dir.mkdir(parents=True, exist_ok=True)
+    runner = get_runner("verilator")
+    start = time.perf_counter()
+    try:
+        results_xml = runner.test(
+            test_module=bench,
+            hdl_toplevel=MODULE_PREFIX + top,
+            build_dir=build_dir,
+            test_dir=test_dir,
+            seed=seed,
+            waves=waves,
+            extra_env={"PYTHONPATH": os.pathsep.join(filter(None, [str(TB_DIR), os.environ.get("PYTHONPATH")]))},
+        )
+        testcases = parse_results(results_xml)
+    except Exception as e:
+        # The simulator crashed, or never got to write its results
+        testcases = [{"name": bench, "status": "error", "message": str(e), "time": 0.0, "sim_time_ns": 0.0}]
+    return testcases, time.perf_counter() - start
+
+
+def parse_results(path):
+    testcases = []
+    for testcase in ET.parse(path).iter("testcase"):
+        status, message = "pass", None
+        for kind in ["failure", "error", "skipped"]:
+            element = testcase.find(kind)
+            if element is not None:
+                status = {"failure": "fail", "error": "error", "skipped": "skip"}[kind]
+                message = element.get("message")
+        testcases.append({
+            "name": testcase.get("name"),
+            "status": status,
+            "message": message,
+            "time": float(testcase.get("time", 0)),
+            "sim_time_ns": float(testcase.get("sim_time_ns", 0)),
+        })
+    return testcases
+
+
+def write_junit(results, path):
+    testsuites = ET.Element("testsuites")
+    for result in results:
+        params = ",".join(f"{k}={v}" for k, v in result["params"].items())
+        suite = ET.SubElement(testsuites, "testsuite", {
+            "name": f"{result['test']}[seed={result['seed']}{',' + params if params else ''}]",
+            "tests": str(len(result["testcases"])),
+            "time": f"{result['wall_time']:.3f}",
+        })
+        for testcase in result["testcases"]:
+            case = ET.SubElement(suite, "testcase", {
+                "classname": result["bench"],
+                "name": testcase["name"],
+                "time": f"{testcase['time']:.3f}",
+            })
+            if testcase["status"] in ("fail", "error"):
+                ET.SubElement(case, "failure" if testcase["status"] == "fail" else "error",
+                              {"message": testcase["message"] or ""})
+            elif testcase["status"] == "skip":
+                ET.SubElement(case, "skipped")
+    ET.ElementTree(testsuites).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def parse_sweeps(sweeps):
+    """Every combination of the --sweep NAME=V1,V2 options"""
+    names, values = [], []
+    for sweep in sweeps:
+        name, _, options = sweep.partition("=")
+        names.append(name)
+        values.append([int(v, 0) for v in options.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def top_sweeps(sweeps, declared):
+    """The sweeps restricted to the parameters a test top declares, without duplicates"""
+    combinations = []
+    for params in sweeps:
+        params = {name: value for name, value in params.items() if name in declared}
+        if params not in combinations:
+            combinations.append(params)
+    return combinations
+
+
+def main():
+    tests = discover_tests()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tests", nargs="*", help=f"tests to run, all by default: {', '.join(tests)}")
+    parser.add_argument("--seeds", type=int, default=1, help="random seeds to run each bench with")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2",
+                        help="test top parameter values to sweep")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="parallel builds and runs")
+    parser.add_argument("--waves", action="store_true", help="dump waveforms")
+    parser.add_argument("--no-veryl-build", action="store_true", help="use the SystemVerilog already in target/")
+    args = parser.parse_args()
+
+    for name in args.tests:
+        if name not in tests:
+            parser.error(f"unknown test {name}")
+    selected = args.tests or list(tests)
+
+    sweeps = parse_sweeps(args.sweep)
+    declared = set().union(*(tests[name][2] for name in selected))
+    for name in sweeps[0]:
+        if name not in declared:
+            parser.error(f"no selected test top declares parameter {name}")
+
+    if not args.no_veryl_build:
+        subprocess.run(["veryl", "build", "--quiet"], cwd=ROOT, check=True)
+    files = sources()
+
+    # One model per test top and set of parameters
+    models = {}
+    for name in selected:
+        top, _, top_params = tests[name]
+        for params in top_sweeps(sweeps, top_params):
+            key = model_key(top, params, files, args.waves)
+            models[key] = (top, params)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        builds = {
+            key: pool.submit(build, top, params, files, OUTPUT_DIR / "models" / key, args.waves)
+            for key, (top, params) in models.items()
+        }
+        build_times = {key: future.result() for key, future in builds.items()}
+
+        jobs = []
+        for name in selected:
+            top, bench, top_params = tests[name]
+            for params in top_sweeps(sweeps, top_params):
+                key = model_key(top, params, files, args.waves)
+                for seed in range(args.seed, args.seed + args.seeds):
+                    jobs.append((name, bench, key, params, seed, (
+                        top, bench, params, seed, OUTPUT_DIR / "models" / key,
+                        OUTPUT_DIR / "runs" / f"{name}-{key}-{seed}", args.waves,
+                    )))
+        runs = [pool.submit(run, job[-1]) for job in jobs]
+
+        results = []
+        for (name, bench, key, params, seed, _), future in zip(jobs, runs):
+            testcases, wall_time = future.result()
+            results.append({
+                "test": name,
+                "bench": bench,
+                "model": key,
+                "params": params,
+                "seed": seed,
+                "build_time": build_times[key],
+                "wall_time": wall_time,
+                "testcases": testcases,
+            })
+            failed = [t["name"] for t in testcases if t["status"] in ("fail", "error")]
+            print(f"{'FAIL' if failed else 'PASS'} {name} seed={seed} {params or ''} "
+                  f"({wall_time:.1f} s){': ' + ', '.join(failed) if failed else ''}")
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(OUTPUT_DIR / "results.json", "w") as f:
+        json.dump({"wall_time": time.perf_counter() - start, "results": results}, f, indent=2)
+    write_junit(results, OUTPUT_DIR / "results.xml")
+
+    testcases = [t for result in results for t in result["testcases"]]
+    failures = sum(t["status"] in ("fail", "error") for t in testcases)
+    print(f"{len(testcases)} tests, {failures} failed, in {time.perf_counter() - start:.1f} s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, Timer
+from memutils_tb import MemoryBackdoor
+import os
 import random
+import tempfile
 
 @cocotb.test()
 async def scratchpad_ram_test(dut):
@@ -11,11 +14,11 @@ async def scratchpad_ram_test(dut):
 
     # Init and reset
     dut.rst.value = 0
-    dut.write_port.write_enable.value = 0
+    dut.write_port[0].write_enable.value = 0
     dut.read_ports[0].address.value = 0
     dut.read_ports[1].address.value = 0
-    dut.write_port.address.value = 0
-    dut.write_port.data.value = 0
+    dut.write_port[0].address.value = 0
+    dut.write_port[0].data.value = 0
 
     await RisingEdge(dut.clk)
     dut.rst.value = 1  # release reset
@@ -41,20 +44,20 @@ async def scratchpad_ram_test(dut):
         assert dut.read_ports[1].data.value == theorical_regs[read_address2]
 
         # perform a random write
-        dut.write_port.address.value = write_address
-        dut.write_port.write_enable.value = 1
-        dut.write_port.data.value = write_value
+        dut.write_port[0].address.value = write_address
+        dut.write_port[0].write_enable.value = 1
+        dut.write_port[0].data.value = write_value
         await RisingEdge(dut.clk)
-        dut.write_port.write_enable.value = 0
+        dut.write_port[0].write_enable.value = 0
         theorical_regs[write_address] = write_value
         await Timer(1, units="ns")
 
     await Timer(1, units="ns")
-    dut.write_port.address.value = 0
-    dut.write_port.write_enable.value = 1
-    dut.write_port.data.value = 0xAEAEAEAE
+    dut.write_port[0].address.value = 0
+    dut.write_port[0].write_enable.value = 1
+    dut.write_port[0].data.value = 0xAEAEAEAE
     await RisingEdge(dut.clk)
-    dut.write_port.write_enable.value = 0
+    dut.write_port[0].write_enable.value = 0
     theorical_regs[write_address] = 0
 
     await Timer(1, units="ns") # wait a ns to test async read
@@ -62,4 +65,196 @@ async def scratchpad_ram_test(dut):
     await Timer(1, units="ns")
     assert int(dut.read_ports[0].data.value) == 0xAEAEAEAE
 
-    print("Random write/read test completed successfully.")
\ No newline at end of file
+    print("Random write/read test completed successfully.")
+NUM_READ_PORTS = 4
+NUM_WRITE_PORTS = 3
+NUM_REGS = 32
+
+@cocotb.test()
+async def multi_write_test(dut):
+    """Random writes on every write port at once, checked against a reference model"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await RisingEdge(dut.clk)
+
+    read_ports = [dut.read_ports_mw[p] for p in range(NUM_READ_PORTS)]
+    write_ports = [dut.write_ports_mw[w] for w in range(NUM_WRITE_PORTS)]
+
+    # Init and reset
+    dut.rst.value = 0
+    for port in read_ports:
+        port.address.value = 0
+    for port in write_ports:
+        port.write_enable.value = 0
+        port.address.value = 0
+        port.data.value = 0
+
+    await RisingEdge(dut.clk)
+    dut.rst.value = 1  # release reset
+    await RisingEdge(dut.clk)
+
+    model = [0] * NUM_REGS
+
+    for _ in range(2000):
+        await Timer(1, units="ns")
+
+        # Random writes, several ports may target the same address
+        writes = []
+        for port in write_ports:
+            enable = random.random() < 0.7
+            address = random.randrange(NUM_REGS)
+            data = random.getrandbits(32)
+            port.write_enable.value = int(enable)
+            port.address.value = address
+            port.data.value = data
+            if enable:
+                writes.append((address, data))
+
+        # The highest-numbered port wins
+        written = {}
+        for address, data in writes:
+            written[address] = data
+
+        # Reads of an address being written see the new data
+        addresses = [random.randrange(NUM_REGS) for _ in read_ports]
+        for port, address in zip(read_ports, addresses):
+            port.address.value = address
+        await Timer(1, units="ns")
+        for p, (port, address) in enumerate(zip(read_ports, addresses)):
+            expected = written.get(address, model[address])
+            got = int(port.data.value)
+            assert got == expected, \
+                f"Read port {p}, address {address}: expected {hex(expected)}, got {hex(got)}"
+
+        await RisingEdge(dut.clk)
+        for address, data in written.items():
+            model[address] = data
+
+    for port in write_ports:
+        port.write_enable.value = 0
+    await Timer(1, units="ns")
+
+    # Every register holds the last value written to it
+    for address in range(NUM_REGS):
+        read_ports[0].address.value = address
+        await Timer(1, units="ns")
+        assert int(read_ports[0].data.value) == model[address]
+
+    # The backdoor follows the live value table
+    backdoor = MemoryBackdoor(dut.regfile_mw)
+    assert list(backdoor.dump()) == model
+
+    # Backdoor loads are seen by every read port
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "regs.hex")
+        with open(path, "w") as f:
+            f.write("// Register file image\n@4\nDEADBEEF 0000_0001\n/* skip */ @1F CAFEBABE\n")
+        backdoor.load_hex(path)
+    model[4:6] = [0xDEADBEEF, 0x00000001]
+    model[31] = 0xCAFEBABE
+
+    for address in range(NUM_REGS):
+        for port in read_ports:
+            port.address.value = address
+        await Timer(1, units="ns")
+        for port in read_ports:
+            assert int(port.data.value) == model[address]
+
+    print("Multi-writer test completed successfully.")
+
+SWEEP_DEPTH = 64
+NONE_DEPTH = 1024
+
+@cocotb.test()
+async def reset_modes_test(dut):
+    """Check ready and the contents after reset in every reset mode"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await RisingEdge(dut.clk)
+
+    read_ports = [dut.read_ports_sweep[p] for p in range(2)]
+    write_ports = [dut.write_ports_sweep[w] for w in range(2)]
+    for port in read_ports:
+        port.address.value = 0
+    for port in write_ports + [dut.write_ports_none[0]]:
+        port.write_enable.value = 0
+        port.address.value = 0
+        port.data.value = 0
+    dut.read_ports_none[0].address.value = 0
+
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+    dut.rst.value = 1  # release reset
+    await RisingEdge(dut.clk)
+    await Timer(1, units="ns")
+
+    # Full and no-reset modes are ready straight out of reset
+    assert dut.ready.value == 1
+    assert dut.ready_none.value == 1
+
+    # Wait for the first sweep, then dirty the whole sweep RAM
+    while dut.ready_sweep.value == 0:
+        await RisingEdge(dut.clk)
+        await Timer(1, units="ns")
+
+    for address in range(SWEEP_DEPTH):
+        write_ports[address % 2].address.value = address
+        write_ports[address % 2].data.value = 0xDEAD0000 | address
+        write_ports[address % 2].write_enable.value = 1
+        await RisingEdge(dut.clk)
+        write_ports[address % 2].write_enable.value = 0
+    await Timer(1, units="ns")
+
+    read_ports[0].address.value = SWEEP_DEPTH - 1
+    await Timer(1, units="ns")
+    assert int(read_ports[0].data.value) == 0xDEAD0000 | (SWEEP_DEPTH - 1)
+
+    # Reset again: one entry is cleared per cycle
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+    await Timer(1, units="ns")
+    dut.rst.value = 1
+    assert dut.ready_sweep.value == 0
+
+    # Writes during the sweep are ignored
+    write_ports[1].address.value = SWEEP_DEPTH - 1
+    write_ports[1].data.value = 0xBAD0BAD0
+    write_ports[1].write_enable.value = 1
+
+    cycles = 0
+    while True:
+        await RisingEdge(dut.clk)
+        await Timer(1, units="ns")
+        cycles += 1
+        if dut.ready_sweep.value == 1:
+            break
+        assert cycles <= SWEEP_DEPTH
+    write_ports[1].write_enable.value = 0
+    assert cycles == SWEEP_DEPTH
+
+    # Every entry reads back as 0 once ready
+    for address in range(0, SWEEP_DEPTH, 2):
+        read_ports[0].address.value = address
+        read_ports[1].address.value = address + 1
+        await Timer(1, units="ns")
+        assert int(read_ports[0].data.value) == 0
+        assert int(read_ports[1].data.value) == 0
+
+    # The RAM without reset still reads back what was written
+    write_port = dut.write_ports_none[0]
+    model = {}
+    for _ in range(200):
+        address = random.randrange(NONE_DEPTH)
+        data = random.getrandbits(32)
+        write_port.address.value = address
+        write_port.data.value = data
+        write_port.write_enable.value = 1
+        model[address] = data
+        await RisingEdge(dut.clk)
+    write_port.write_enable.value = 0
+    await Timer(1, units="ns")
+
+    for address, data in model.items():
+        dut.read_ports_none[0].address.value = address
+        await Timer(1, units="ns")
+        assert int(dut.read_ports_none[0].data.value) == data
+
+    print("Reset modes test completed successfully.")
@@ -8,13 +8,15 @@
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
+from memutils_tb import BramPortBundle, MemoryBackdoor, MemoryModel, Scoreboard, byte_mask
+import numpy as np
 
 @cocotb.coroutine
 async def reset(dut):
     dut.rst.value = 0
     # Asserting RESET does not set the memory to 0, just like in real hardware.
     # We do it manually for testing purposes
-    dut.ram.mem.value = [0] * len(dut.ram.mem.value)
+    MemoryBackdoor(dut.ram).fill(0)
     await RisingEdge(dut.clk)
     dut.port.enable.value = 0
     dut.port.byte_write_enable.value = 0
@@ -107,12 +109,7 @@ async def memory_data_test(dut):
         await reset(dut) # we reset memory..
         dut.port.enable.value = 1
         
-        # generate mask from byte_enable
-        mask = 0
-        for j in range(4):
-            if (byte_enable >> j) & 1:
-                mask |= (0xFF << (j * 8))
-
+        mask = byte_mask(byte_enable)
         print(f"mask: {mask}")
 
         for address, data in test_data:
@@ -130,4 +127,32 @@ async def memory_data_test(dut):
 
             # Check that we're only touching the concerned bytes
             assert dut.port.read_data.value & mask == data & mask
-            assert dut.port.read_data.value & ~mask == dut.ram.mem.value[int(address/4)] & ~mask
+            assert dut.port.read_data.value & ~mask == MemoryBackdoor(dut.ram)[int(address/4)] & ~mask
+
+NUM_WRITES = 100_000
+
+@cocotb.test()
+async def random_write_scoreboard_test(dut):
+    """Random byte-enable writes, checked against the reference model in one go"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    backdoor = MemoryBackdoor(dut.ram)
+    # DATA_WIDTH is a test top parameter
+    num_col = backdoor.bytes_per_word
+    model = MemoryModel(num_col * len(backdoor), 8 * num_col)
+
+    rng = np.random.default_rng(0)
+    addresses = rng.integers(0, len(backdoor), NUM_WRITES)
+    data = rng.integers(0, 1 << (8 * num_col), NUM_WRITES, dtype=np.uint64)
+    selects = rng.integers(0, 1 << num_col, NUM_WRITES)
+
+    port = BramPortBundle(dut.port)
+    clk = RisingEdge(dut.clk)
+    for address, word, select in zip(addresses.tolist(), data.tolist(), selects.tolist()):
+        port.write(enable=1, address=address, write_data=word, byte_write_enable=select)
+        await clk
+    port.idle()
+    await clk
+
+    model.write_many(num_col * addresses, data, selects)
+    Scoreboard(model, backdoor).check()
@@ -0,0 +1,172 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, WishboneMonitor, idle_bus
+import random
+
+RAM_SIZE = 4096
+NUM_MASTERS = 4
+NUM_BANKS = 4
+TRACE_LENGTH = 1000
+
+def banked_masters(dut):
+    return [dut.masters[i] for i in range(NUM_MASTERS)]
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    # Manually clear RAM for test repeatability
+    for b in range(NUM_BANKS):
+        MemoryBackdoor(dut.ram.g_banks[b].bank).fill(0)
+    MemoryBackdoor(dut.dp_ram.ram).fill(0)
+    await RisingEdge(dut.clk)
+
+    for wb in banked_masters(dut) + [dut.wb_a, dut.wb_b]:
+        idle_bus(wb)
+
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    print("reset done !")
+
+async def stream(clk, wb, requests, responses):
+    """Issue (address, write, data) requests back to back, one per
+    cycle while STALL is low, and collect the read data of every
+    response. Returns the number of cycles taken."""
+    issued = 0
+    cycles = 0
+
+    wb.cyc.value = 1
+    wb.select.value = 0b1111
+    while len(responses) < len(requests):
+        if issued < len(requests):
+            address, write, data = requests[issued]
+            wb.stb.value = 1
+            wb.addr.value = address
+            wb.write_enable.value = int(write)
+            wb.write_data.value = data
+        else:
+            wb.stb.value = 0
+
+        await RisingEdge(clk)
+        cycles += 1
+
+        assert wb.stall.value.is_resolvable, "STALL is not stable"
+        if wb.stb.value == 1 and wb.stall.value == 0:
+            issued += 1
+        assert wb.err.value == 0
+        if wb.ack.value == 1:
+            responses.append(int(wb.read_data.value))
+
+    idle_bus(wb)
+    return cycles
+
+def random_trace(rng, base, region):
+    return [4 * rng.randrange(region // 4) + base for _ in range(TRACE_LENGTH)]
+
+def sequential_trace(rng, base, region):
+    return [base + (4 * i) % region for i in range(TRACE_LENGTH)]
+
+def conflicting_trace(rng, base, region):
+    # Every access of every master goes to the same bank
+    return [base + (4 * NUM_BANKS * i) % region for i in range(TRACE_LENGTH)]
+
+def make_requests(rng, trace):
+    """Mix of writes and reads over the trace, with the expected
+    read data. Each master owns its region, so results do not depend
+    on how conflicts between masters are arbitrated."""
+    model = {}
+    requests = []
+    expected = []
+    for address in trace:
+        if rng.random() < 0.5:
+            data = rng.getrandbits(32)
+            model[address] = data
+            requests.append((address, True, data))
+        else:
+            requests.append((address, False, 0))
+            expected.append((len(requests) - 1, model.get(address, 0)))
+    return requests, expected
+
+async def run_traffic(dut, masters, make_trace, rng):
+    """Run a trace on every master at once. Returns the aggregate
+    number of transactions per cycle, and the cycles taken by each master."""
+    region = RAM_SIZE // len(masters)
+    work = [make_requests(rng, make_trace(rng, i * region, region)) for i in range(len(masters))]
+    responses = [[] for _ in masters]
+    monitors = [WishboneMonitor(dut.clk, wb, name=f"master {i}") for i, wb in enumerate(masters)]
+
+    drivers = [
+        cocotb.start_soon(stream(dut.clk, wb, requests, responses[i]))
+        for i, (wb, (requests, _)) in enumerate(zip(masters, work))
+    ]
+    cycles = [await driver for driver in drivers]
+
+    for monitor, (requests, _) in zip(monitors, work):
+        monitor.stop()
+        summary = monitor.report()
+        assert summary["acks"] == len(requests)
+        assert summary["aborted"] == 0
+
+    for i, (_, expected) in enumerate(work):
+        for index, data in expected:
+            got = responses[i][index]
+            assert got == data, f"Master {i}, request {index}: expected {hex(data)}, got {hex(got)}"
+
+    transactions = sum(len(requests) for requests, _ in work)
+    return transactions / max(cycles), cycles
+
+@cocotb.test()
+async def banked_throughput_test(dut):
+    """Compare aggregate throughput of the banked RAM and the dual-port RAM"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+
+    traces = [
+        ("random", random_trace),
+        ("sequential", sequential_trace),
+        ("conflicting", conflicting_trace),
+    ]
+    results = {}
+    for trace_name, make_trace in traces:
+        for name, masters in [("banked", banked_masters(dut)), ("dual-port", [dut.wb_a, dut.wb_b])]:
+            await reset(dut)
+            rng = random.Random(trace_name)
+            throughput, cycles = await run_traffic(dut, masters, make_trace, rng)
+            results[(name, trace_name)] = throughput
+            dut._log.info(
+                f"{name}, {trace_name} traffic: {throughput:.2f} transactions/cycle, "
+                f"cycles per master {cycles}"
+            )
+
+            if name == "banked" and trace_name == "conflicting":
+                # A single bank is shared fairly: every master finishes within one round
+                assert max(cycles) - min(cycles) <= NUM_MASTERS
+
+    # Sequential masters settle on different banks after the first conflict
+    assert results[("banked", "sequential")] > NUM_MASTERS - 0.1
+    assert results[("banked", "random")] > results[("dual-port", "random")]
+    # Two ports are always available on the dual-port RAM
+    assert results[("dual-port", "random")] > 1.95
+
+@cocotb.test()
+async def banked_misaligned_test(dut):
+    """Misaligned requests are rejected with ERR"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    wb = banked_masters(dut)[2]
+
+    wb.cyc.value = 1
+    wb.stb.value = 1
+    wb.select.value = 0b1111
+    wb.addr.value = 0x102
+    await RisingEdge(dut.clk)
+    assert wb.stall.value == 0
+
+    wb.stb.value = 0
+    await RisingEdge(dut.clk)
+    assert wb.err.value == 1
+    assert wb.ack.value == 0
+    idle_bus(wb)
+    await RisingEdge(dut.clk)
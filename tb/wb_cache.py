@@ -0,0 +1,166 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, WishboneMaster, WishboneTransaction, byte_mask, idle_bus
+import random
+
+# Size of the RAM behind each cache, in bytes
+RAM_SIZE = 16384
+TRACE_LENGTH = 2000
+
+def initial_word(index):
+    return (0xA5A50000 ^ (index * 0x9E3779B1)) & 0xFFFFFFFF
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    for ram in [dut.ram_wb, dut.ram_wt]:
+        backdoor = MemoryBackdoor(ram.ram)
+        backdoor.load([initial_word(i) for i in range(len(backdoor))])
+    await RisingEdge(dut.clk)
+
+    for wb in [dut.core_wb, dut.core_wt]:
+        idle_bus(wb)
+
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    print("reset done !")
+
+def sequential_trace(rng):
+    return [4 * i for i in range(TRACE_LENGTH)]
+
+def strided_trace(rng):
+    # Walk a few arrays with a stride larger than a line
+    stride = 68
+    return [(i * stride) % RAM_SIZE for i in range(TRACE_LENGTH)]
+
+def random_trace(rng):
+    # Mostly local accesses, with the occasional far jump
+    trace = []
+    address = 0
+    for _ in range(TRACE_LENGTH):
+        if rng.random() < 0.1:
+            address = rng.randrange(0, RAM_SIZE, 4)
+        else:
+            address = (address + 4 * rng.randint(-8, 8)) % RAM_SIZE
+        trace.append(address)
+    return trace
+
+async def access(master, address, write, data, select):
+    """Run a single transaction. Returns the number of cycles between
+    the request being accepted and its ACK, and the read data"""
+    transaction = await master.submit(WishboneTransaction(address, write, data, select))
+    assert transaction.ack, f"ERR at address {hex(address)}"
+    return transaction.latency, transaction.read_data
+
+async def replay(dut, wb, trace, rng):
+    master = WishboneMaster(dut.clk, wb)
+    model = {}
+    reads = 0
+    read_hits = 0
+    total_latency = 0
+
+    for address in trace:
+        word = address // 4
+        expected = model.get(word, initial_word(word))
+        if rng.random() < 0.25:
+            select = rng.choice([0b1111, 0b0001, 0b0110, 0b1000])
+            data = rng.getrandbits(32)
+            latency, _ = await access(master, address, True, data, select)
+            mask = byte_mask(select)
+            model[word] = (expected & ~mask) | (data & mask)
+        else:
+            latency, read_data = await access(master, address, False, 0, 0b1111)
+            assert read_data == expected, \
+                f"Error at address {hex(address)}: expected {hex(expected)}, got {hex(read_data)}"
+            reads += 1
+            # A hit is acknowledged on the cycle after the request
+            read_hits += int(latency == 1)
+        total_latency += latency
+
+    master.stop()
+    return read_hits / reads, total_latency / len(trace)
+
+@cocotb.test()
+async def cache_trace_benchmark(dut):
+    """Replay synthetic traces through both caches, report hit rate and latency"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+
+    traces = [
+        ("sequential", sequential_trace),
+        ("strided", strided_trace),
+        ("random", random_trace),
+    ]
+    for name, wb in [("2-way write-back", dut.core_wb), ("direct-mapped write-through", dut.core_wt)]:
+        for trace_name, make_trace in traces:
+            await reset(dut)
+            rng = random.Random(trace_name)
+            hit_rate, latency = await replay(dut, wb, make_trace(rng), rng)
+            dut._log.info(
+                f"{name}, {trace_name} trace: read hit rate {hit_rate:.3f}, "
+                f"average latency {latency:.2f} cycles"
+            )
+
+@cocotb.test()
+async def cache_pipelined_hits_test(dut):
+    """Read hits can be pipelined one per clock"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    master = WishboneMaster(dut.clk, dut.core_wb)
+
+    # Bring a line in
+    await access(master, 0x100, False, 0, 0b1111)
+    await RisingEdge(dut.clk)
+
+    reads = await master.run([WishboneTransaction(0x100 + 4 * i, False) for i in range(4)])
+    master.stop()
+
+    assert [read.read_data for read in reads] == [initial_word(0x40 + i) for i in range(4)]
+    # Issued on consecutive clocks, each answered on the next one
+    assert [read.issue_cycle - reads[0].issue_cycle for read in reads] == [0, 1, 2, 3]
+    assert all(read.latency == 1 for read in reads)
+
+@cocotb.test()
+async def cache_abort_refill_test(dut):
+    """The core dropping CYC in the middle of a refill gets no ACK, and
+    the line being replaced is not left valid with half refilled data"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    wb = dut.core_wb
+
+    # Fill both ways of set 0
+    master = WishboneMaster(dut.clk, wb)
+    for address in [0x200, 0x300]:
+        await access(master, address, False, 0, 0b1111)
+    master.stop()
+    await RisingEdge(dut.clk)
+
+    # Miss in set 0, replacing the line at 0x200, aborted mid refill
+    wb.cyc.value = 1
+    wb.stb.value = 1
+    wb.write_enable.value = 0
+    wb.select.value = 0b1111
+    wb.addr.value = 0x400
+    await RisingEdge(dut.clk)
+    assert wb.stall.value == 0
+    wb.stb.value = 0
+    for _ in range(3):
+        await RisingEdge(dut.clk)
+        assert wb.ack.value == 0
+    idle_bus(wb)
+    for _ in range(8):
+        await RisingEdge(dut.clk)
+        assert wb.ack.value == 0, "ACK after the core dropped CYC"
+        assert wb.err.value == 0, "ERR after the core dropped CYC"
+
+    master = WishboneMaster(dut.clk, wb)
+    for base in [0x200, 0x300, 0x400]:
+        reads = await master.run([WishboneTransaction(base + 4 * i, False) for i in range(4)])
+        for read in reads:
+            expected = initial_word(read.address // 4)
+            assert read.ack and read.read_data == expected, \
+                f"{read}: expected {hex(expected)}, got {read.read_data and hex(read.read_data)}"
+    master.stop()
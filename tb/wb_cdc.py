@@ -0,0 +1,132 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, Timer
+from cocotb.utils import get_sim_time
+from memutils_tb import MemoryBackdoor, idle_bus
+import random
+
+RAM_SIZE = 4096
+
+# (master clock period, slave clock period), in ps
+CLOCK_PERIODS = [
+    (1000, 1000),
+    (1000, 1370),
+    (1370, 1000),
+    (1000, 2910),
+    (2910, 1000),
+]
+
+def start_clocks(dut, master_period, slave_period):
+    return [
+        cocotb.start_soon(Clock(dut.clk, master_period, units="ps").start()),
+        cocotb.start_soon(Clock(dut.clk_s, slave_period, units="ps").start()),
+    ]
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    # Manually clear RAM for test repeatability
+    MemoryBackdoor(dut.ram.ram).fill(0)
+    idle_bus(dut.master_wb)
+    for _ in range(4):
+        await RisingEdge(dut.clk)
+        await RisingEdge(dut.clk_s)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    print("reset done !")
+
+async def stream(dut, wb, requests):
+    """Issue (address, write, data) requests back to back, one per
+    master cycle while STALL is low. Returns the read data of every
+    response, in order."""
+    responses = []
+    issued = 0
+
+    wb.cyc.value = 1
+    wb.select.value = 0b1111
+    while len(responses) < len(requests):
+        if issued < len(requests):
+            address, write, data = requests[issued]
+            wb.stb.value = 1
+            wb.addr.value = address
+            wb.write_enable.value = int(write)
+            wb.write_data.value = data
+        else:
+            wb.stb.value = 0
+
+        await RisingEdge(dut.clk)
+
+        if wb.stb.value == 1 and wb.stall.value == 0:
+            issued += 1
+        assert wb.err.value == 0
+        if wb.ack.value == 1:
+            responses.append(int(wb.read_data.value))
+
+    idle_bus(wb)
+    await RisingEdge(dut.clk)
+    return responses
+
+@cocotb.test()
+async def cdc_throughput_test(dut):
+    """Stream pipelined traffic across the bridge at several clock ratios"""
+    for master_period, slave_period in CLOCK_PERIODS:
+        clocks = start_clocks(dut, master_period, slave_period)
+        await reset(dut)
+
+        rng = random.Random(master_period * slave_period)
+        words = RAM_SIZE // 4
+        data = [rng.getrandbits(32) for _ in range(words)]
+        writes = [(4 * i, True, d) for i, d in enumerate(data)]
+        reads = [(4 * i, False, 0) for i in range(words)]
+
+        start = get_sim_time(units="ps")
+        await stream(dut, dut.master_wb, writes)
+        read_data = await stream(dut, dut.master_wb, reads)
+        elapsed = get_sim_time(units="ps") - start
+
+        for i, (expected, got) in enumerate(zip(data, read_data)):
+            assert expected == got, f"Error at address {hex(4 * i)}: expected {hex(expected)}, got {hex(got)}"
+
+        # The slower side bounds throughput to one transaction per cycle
+        slow_cycles = elapsed / max(master_period, slave_period)
+        efficiency = 2 * words / slow_cycles
+        dut._log.info(
+            f"master {master_period} ps, slave {slave_period} ps: "
+            f"{2 * words * 1000 / elapsed:.3f} transactions/ns, "
+            f"{efficiency:.3f} transactions per slow-side cycle"
+        )
+        assert efficiency > 0.8
+
+        for clock in clocks:
+            clock.kill()
+        await Timer(10, units="ns")
+
+@cocotb.test()
+async def cdc_abort_test(dut):
+    """Responses to an aborted cycle never reach the next one"""
+    clocks = start_clocks(dut, 1000, 2910)
+    await reset(dut)
+    wb = dut.master_wb
+
+    backdoor = MemoryBackdoor(dut.ram.ram)
+    backdoor.load([0x1000 + i for i in range(len(backdoor))])
+
+    # Issue a few reads, then drop CYC before they come back
+    wb.cyc.value = 1
+    wb.stb.value = 1
+    wb.select.value = 0b1111
+    for i in range(4):
+        wb.addr.value = 4 * i
+        await RisingEdge(dut.clk)
+        assert wb.stall.value == 0
+    idle_bus(wb)
+    await RisingEdge(dut.clk)
+
+    # The next cycle only sees its own response
+    read_data = await stream(dut, wb, [(0x40, False, 0)])
+    assert read_data == [0x1010]
+
+    for clock in clocks:
+        clock.kill()
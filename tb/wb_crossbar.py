@@ -0,0 +1,230 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import (
+    MemoryBackdoor, WishboneMaster, WishboneMonitor, WishboneTransaction, burst_read, idle_bus, single_read,
+)
+import random
+
+NUM_MASTERS = 4
+NUM_SLAVES = 4
+# Size of each RAM, and of its address region
+RAM_SIZE = 4096
+TRACE_LENGTH = 1000
+
+def crossbar_masters(dut):
+    return [dut.masters[i] for i in range(NUM_MASTERS)]
+
+def shared_masters(dut):
+    return [dut.shared_masters[i] for i in range(NUM_MASTERS)]
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    # Manually clear RAMs for test repeatability
+    for s in range(NUM_SLAVES):
+        MemoryBackdoor(dut.g_rams[s].ram.ram).fill(0)
+        MemoryBackdoor(dut.g_rams[s].shared_ram.ram).fill(0)
+    for wb in crossbar_masters(dut) + shared_masters(dut):
+        idle_bus(wb)
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+# Traces give the address of every access of master `master`. Masters
+# never share a word, so results do not depend on arbitration
+
+def private_trace(rng, master):
+    # Every master talks to its own RAM
+    return [master * RAM_SIZE + 4 * rng.randrange(RAM_SIZE // 4) for _ in range(TRACE_LENGTH)]
+
+def conflicting_trace(rng, master):
+    # Every master talks to RAM 0, in its own slice
+    slice_size = RAM_SIZE // NUM_MASTERS
+    return [master * slice_size + 4 * rng.randrange(slice_size // 4) for _ in range(TRACE_LENGTH)]
+
+def random_trace(rng, master):
+    # Every master talks to every RAM, in its own slice of each
+    slice_size = RAM_SIZE // NUM_MASTERS
+    return [
+        rng.randrange(NUM_SLAVES) * RAM_SIZE + master * slice_size + 4 * rng.randrange(slice_size // 4)
+        for _ in range(TRACE_LENGTH)
+    ]
+
+def make_transactions(rng, trace):
+    """Mix of writes and reads over the trace, with the read data
+    expected for each read"""
+    model = {}
+    transactions = []
+    expected = []
+    for address in trace:
+        if rng.random() < 0.5:
+            data = rng.getrandbits(32)
+            model[address] = data
+            transactions.append(WishboneTransaction(address, True, data))
+        else:
+            read = WishboneTransaction(address, False)
+            transactions.append(read)
+            expected.append((read, model.get(address, 0)))
+    return transactions, expected
+
+async def run_traffic(dut, masters, make_trace, rng):
+    """Run a trace on every master at once, each through its own
+    WishboneMaster. Returns the aggregate number of transactions per
+    cycle, and the cycles taken by each master."""
+    work = [make_transactions(rng, make_trace(rng, i)) for i in range(len(masters))]
+    monitors = [WishboneMonitor(dut.clk, wb, name=f"master {i}") for i, wb in enumerate(masters)]
+    drivers = [WishboneMaster(dut.clk, wb) for wb in masters]
+
+    # Every master starts on the same edge, so cycle counts line up
+    for driver, (transactions, _) in zip(drivers, work):
+        for transaction in transactions:
+            driver.submit(transaction)
+    for driver in drivers:
+        await driver.wait_idle()
+        driver.stop()
+
+    for monitor, (transactions, _) in zip(monitors, work):
+        monitor.stop()
+        summary = monitor.report()
+        assert summary["acks"] == len(transactions)
+        assert summary["aborted"] == 0
+
+    for i, (transactions, expected) in enumerate(work):
+        for transaction in transactions:
+            assert transaction.ack and not transaction.err, f"Master {i}: {transaction} not acknowledged"
+        for read, data in expected:
+            assert read.read_data == data, f"Master {i}, {read}: expected {hex(data)}, got {hex(read.read_data)}"
+
+    cycles = [transactions[-1].response_cycle for transactions, _ in work]
+    return sum(len(transactions) for transactions, _ in work) / max(cycles), cycles
+
+@cocotb.test()
+async def crossbar_throughput_test(dut):
+    """Compare aggregate throughput of the crossbar and of a shared bus"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+
+    runs = [
+        ("crossbar", crossbar_masters, "private", private_trace),
+        ("shared bus", shared_masters, "private", private_trace),
+        ("crossbar", crossbar_masters, "conflicting", conflicting_trace),
+        ("shared bus", shared_masters, "conflicting", conflicting_trace),
+        ("crossbar", crossbar_masters, "random", random_trace),
+        ("shared bus", shared_masters, "random", random_trace),
+    ]
+    results = {}
+    for name, masters, trace_name, make_trace in runs:
+        await reset(dut)
+        rng = random.Random(trace_name)
+        throughput, cycles = await run_traffic(dut, masters(dut), make_trace, rng)
+        results[(name, trace_name)] = throughput
+        dut._log.info(
+            f"{name}, {trace_name} traffic: {throughput:.2f} transactions/cycle, "
+            f"cycles per master {cycles}"
+        )
+
+    # Every master has its own path to its own RAM
+    assert results[("crossbar", "private")] > NUM_MASTERS - 0.1
+    assert results[("shared bus", "private")] < 1.01
+    # A single RAM serves one request per cycle either way
+    assert results[("crossbar", "conflicting")] > 0.95
+    # Masters switching RAMs wait for their responses, and collide
+    # with each other, but still overlap
+    assert results[("crossbar", "random")] > 1.3
+    assert results[("shared bus", "random")] < 1.01
+
+@cocotb.test()
+async def crossbar_unmapped_test(dut):
+    """Requests that hit no slave are answered with ERR"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    wb = crossbar_masters(dut)[1]
+
+    wb.cyc.value = 1
+    wb.stb.value = 1
+    wb.select.value = 0b1111
+    wb.addr.value = NUM_SLAVES * RAM_SIZE + 0x100
+    await RisingEdge(dut.clk)
+    assert wb.stall.value == 0
+    for s in range(NUM_SLAVES):
+        assert dut.slaves[s].cyc.value == 0
+
+    wb.stb.value = 0
+    await RisingEdge(dut.clk)
+    assert wb.err.value == 1
+    assert wb.ack.value == 0
+    idle_bus(wb)
+    await RisingEdge(dut.clk)
+    assert wb.err.value == 0
+
+@cocotb.test()
+async def crossbar_abort_test(dut):
+    """A master dropping CYC with a request in flight: the slave sees
+    the abort before another master gets it, and its response is lost"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    backdoor = MemoryBackdoor(dut.g_rams[0].ram.ram)
+    contents = [0xAB000000 | i for i in range(len(backdoor))]
+    backdoor.load(contents)
+    aborting, waiting = crossbar_masters(dut)[:2]
+
+    aborting.cyc.value = 1
+    aborting.stb.value = 1
+    aborting.write_enable.value = 0
+    aborting.select.value = 0b1111
+    aborting.addr.value = 0x100
+    await RisingEdge(dut.clk)
+    assert aborting.stall.value == 0
+
+    # Abort, as another master asks for the same RAM
+    idle_bus(aborting)
+    master = WishboneMaster(dut.clk, waiting)
+    reads = [WishboneTransaction(0x200 + 4 * i, False) for i in range(8)]
+    for read in reads:
+        master.submit(read)
+
+    await RisingEdge(dut.clk)
+    assert dut.slaves[0].cyc.value == 0, "RAM did not see the abort"
+    assert waiting.ack.value == 0
+
+    await master.wait_idle()
+    master.stop()
+    for read in reads:
+        expected = contents[read.address // 4]
+        assert read.ack and read.read_data == expected, \
+            f"{read}: expected {hex(expected)}, got {read.read_data and hex(read.read_data)}"
+
+@cocotb.test()
+async def crossbar_burst_switch_test(dut):
+    """Bursts and single reads from one master to two RAMs, all in a
+    single bus cycle: the master moves on to the other RAM once each
+    burst is over, and the RAM is free for others after it"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    contents = []
+    for s in range(2):
+        backdoor = MemoryBackdoor(dut.g_rams[s].ram.ram)
+        contents.append([(s << 24) | i for i in range(len(backdoor))])
+        backdoor.load(contents[s])
+    wb, other = crossbar_masters(dut)[:2]
+
+    wb.cyc.value = 1
+    assert await burst_read(dut.clk, wb, 0x40, 4) == contents[0][16:20]
+    assert await single_read(dut.clk, wb, RAM_SIZE + 0x80) == contents[1][32]
+    assert await burst_read(dut.clk, wb, RAM_SIZE + 0x100, 8) == contents[1][64:72]
+    assert await single_read(dut.clk, wb, 0x10) == contents[0][4]
+    assert await burst_read(dut.clk, wb, 0x200, 4) == contents[0][128:132]
+    assert await burst_read(dut.clk, wb, RAM_SIZE + 0x200, 4) == contents[1][128:132]
+    idle_bus(wb)
+
+    await RisingEdge(dut.clk)
+    assert wb.ack.value == 0
+
+    # Nothing is left in flight: another master gets both RAMs
+    master = WishboneMaster(dut.clk, other)
+    reads = await master.run([WishboneTransaction(s * RAM_SIZE + 0x300, False) for s in range(2)])
+    master.stop()
+    for s, read in enumerate(reads):
+        assert read.ack and read.read_data == contents[s][0xC0], f"{read}"
@@ -0,0 +1,179 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, WishboneMaster, WishboneTransaction, idle_bus
+import random
+
+# Byte offsets of the registers, see WishboneDmaPkg
+REG_SRC = 0x0
+REG_DST = 0x4
+REG_LEN = 0x8
+REG_CTRL = 0xC
+
+CTRL_START = 1 << 0
+CTRL_DONE = 1 << 1
+CTRL_ERROR = 1 << 2
+CTRL_IRQ_ENABLE = 1 << 3
+
+# Size of each RAM, in bytes
+RAM_SIZE = 16384
+
+# {dma: (cfg bus, irq, source RAM, destination RAM)}
+DMAS = {
+    "dma": ("cfg", "irq", "src_ram", "dst_ram"),
+    "dma_slow": ("cfg_slow", "irq_slow", "src_ram_slow", "dst_ram_slow"),
+}
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    rng = random.Random(22)
+    for cfg, _, src, dst in DMAS.values():
+        idle_bus(getattr(dut, cfg))
+        source = MemoryBackdoor(getattr(dut, src).ram)
+        source.load([rng.getrandbits(32) for _ in range(len(source))])
+        MemoryBackdoor(getattr(dut, dst).ram).fill(0)
+    idle_bus(dut.cfg_err)
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+async def copy(dut, master, irq, src, dst, length):
+    """Run a copy, with the interrupt enabled, and return the cycles from
+    the write that starts it to the interrupt"""
+    await master.run([
+        WishboneTransaction(REG_SRC, True, src),
+        WishboneTransaction(REG_DST, True, dst),
+        WishboneTransaction(REG_LEN, True, length),
+    ])
+    start = await master.write(REG_CTRL, CTRL_START | CTRL_IRQ_ENABLE)
+    cycles = master.cycle - start.issue_cycle
+    while irq.value != 1:
+        await RisingEdge(dut.clk)
+        cycles += 1
+
+    status = (await master.read(REG_CTRL)).read_data
+    assert status & (CTRL_START | CTRL_ERROR) == 0, f"Status {hex(status)} after a copy"
+    await master.write(REG_CTRL, CTRL_DONE)
+    return cycles
+
+def check_copy(dut, src_ram, dst_ram, src, dst, length, expected):
+    """The copied words are in the destination RAM, and the words around them untouched"""
+    source = MemoryBackdoor(src_ram.ram).dump()
+    destination = MemoryBackdoor(dst_ram.ram).dump()
+    for i in range(length // 4):
+        assert destination[dst // 4 + i] == source[src // 4 + i], \
+            f"Word {i} of the copy to {hex(dst)}: expected {hex(int(source[src // 4 + i]))}, got {hex(int(destination[dst // 4 + i]))}"
+    for word in [dst // 4 - 1, (dst + length) // 4]:
+        if 0 <= word < len(destination):
+            assert destination[word] == expected.get(word, 0), f"Word {word} past the copy was overwritten"
+
+@cocotb.test()
+async def copy_test(dut):
+    """Multi-KiB copies between two WishboneRams, at close to one word per clock"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    for name, (cfg, irq, src_ram, dst_ram) in DMAS.items():
+        master = WishboneMaster(dut.clk, getattr(dut, cfg))
+        src_ram, dst_ram = getattr(dut, src_ram), getattr(dut, dst_ram)
+        # Words copied so far, by destination word
+        copied = {}
+        for src, dst, length in [
+            (0x0000, 0x0000, 4096),
+            (0x1000, 0x2000, 8192),
+            (0x0004, 0x3004, 12),
+            (0x3FFC, 0x0FFC, 4),
+        ]:
+            cycles = await copy(dut, master, getattr(dut, irq), src, dst, length)
+            words = length // 4
+            dut._log.info(f"{name}: {length} bytes from {hex(src)} to {hex(dst)} in {cycles} cycles, "
+                          f"{cycles / words:.3f} cycles per word")
+            check_copy(dut, src_ram, dst_ram, src, dst, length, copied)
+            source = MemoryBackdoor(src_ram.ram)
+            copied.update({dst // 4 + i: source[src // 4 + i] for i in range(words)})
+            if name == "dma" and length >= 4096:
+                # A few cycles to start, and to drain the last writes.
+                # dma_slow is limited by its 2-word FIFO
+                assert cycles <= words * 1.1 + 16, f"{name}: {cycles} cycles to copy {words} words"
+        master.stop()
+
+@cocotb.test()
+async def register_test(dut):
+    """Registers read back, DONE is cleared by writing 1, and gates the interrupt"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    master = WishboneMaster(dut.clk, dut.cfg)
+    for register, value in [(REG_SRC, 0x1234), (REG_DST, 0x5678), (REG_LEN, 0x9AB0)]:
+        await master.write(register, value)
+        assert (await master.read(register)).read_data == value
+
+    # Byte writes only change the selected bytes
+    await master.write(REG_SRC, 0xAABBCCDD, select=0b0100)
+    assert (await master.read(REG_SRC)).read_data == 0xBB1234
+
+    # Nothing to copy: done right away, without an interrupt unless enabled
+    await master.write(REG_LEN, 0)
+    await master.write(REG_CTRL, CTRL_START)
+    assert (await master.read(REG_CTRL)).read_data == CTRL_DONE
+    assert dut.irq.value == 0
+
+    await master.write(REG_CTRL, CTRL_IRQ_ENABLE)
+    await RisingEdge(dut.clk)
+    assert dut.irq.value == 1
+    assert (await master.read(REG_CTRL)).read_data == CTRL_DONE | CTRL_IRQ_ENABLE
+
+    await master.write(REG_CTRL, CTRL_DONE | CTRL_IRQ_ENABLE)
+    await RisingEdge(dut.clk)
+    assert dut.irq.value == 0
+    assert (await master.read(REG_CTRL)).read_data == CTRL_IRQ_ENABLE
+
+    # Busy while copying, and the registers can be set up for the next copy
+    await master.write(REG_SRC, 0)
+    await master.write(REG_DST, 0)
+    await master.write(REG_LEN, 1024)
+    await master.write(REG_CTRL, CTRL_START | CTRL_IRQ_ENABLE)
+    assert (await master.read(REG_CTRL)).read_data == CTRL_START | CTRL_IRQ_ENABLE
+    await master.write(REG_LEN, 4)
+    while dut.irq.value != 1:
+        await RisingEdge(dut.clk)
+    check_copy(dut, dut.src_ram, dut.dst_ram, 0, 0, 1024, {})
+    master.stop()
+
+async def error_slave(dut, wb):
+    """Answer every request with ERR, on the next cycle"""
+    wb.stall.value = 0
+    wb.ack.value = 0
+    wb.rty.value = 0
+    wb.read_data.value = 0
+    wb.err.value = 0
+    while True:
+        await RisingEdge(dut.clk)
+        wb.err.value = int(wb.cyc.value == 1 and wb.stb.value == 1)
+
+@cocotb.test()
+async def error_test(dut):
+    """An ERR response aborts the copy, and is reported in the status"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    slave = cocotb.start_soon(error_slave(dut, dut.write_wb_err))
+
+    master = WishboneMaster(dut.clk, dut.cfg_err)
+    await master.write(REG_LEN, 1024)
+    await master.write(REG_CTRL, CTRL_START | CTRL_IRQ_ENABLE)
+    for _ in range(20):
+        await RisingEdge(dut.clk)
+    assert dut.irq_err.value == 1
+    assert dut.write_wb_err.cyc.value == 0 and dut.read_wb_err.cyc.value == 0
+    assert (await master.read(REG_CTRL)).read_data == CTRL_DONE | CTRL_ERROR | CTRL_IRQ_ENABLE
+
+    # The next copy starts afresh, and waits on the stalled bus
+    slave.kill()
+    dut.write_wb_err.err.value = 0
+    dut.write_wb_err.stall.value = 1
+    await master.write(REG_CTRL, CTRL_START | CTRL_IRQ_ENABLE)
+    assert (await master.read(REG_CTRL)).read_data == CTRL_START | CTRL_IRQ_ENABLE
+    master.stop()
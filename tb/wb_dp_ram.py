@@ -1,44 +1,34 @@
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
-
-def assert_ack(wb):
-    assert wb.ack.value == 1
-    assert wb.err.value == 0
-
-def assert_read(wb, address, expected):
-    assert_ack(wb)
-    assert wb.read_data.value == expected, f"Error at address {address}: expected {hex(expected)}, got {hex(wb.read_data.value)}"
-
-def start_read_txn(wb, address, byte_select):
-    wb.cyc.value = 1
-    wb.stb.value = 1
-    wb.write_enable.value = 0
-    wb.select.value = byte_select
-    wb.addr.value = address
-
-def start_write_txn(wb, address, data, byte_select):
-    wb.cyc.value = 1
-    wb.stb.value = 1
-    wb.write_enable.value = 1
-    wb.select.value = byte_select
-    wb.addr.value = address
-    wb.write_data.value = data
-
-def finish_txn(wb):
-    wb.cyc.value = 0
-    wb.stb.value = 0
+from memutils_tb import (
+    MemoryBackdoor, MemoryModel, Scoreboard, SparseMemoryModel, TrafficGenerator, TrafficProfile,
+    WishboneMaster, WishboneTransaction, byte_mask, check_concurrent, idle_bus,
+)
+import numpy as np
+import random
+
+def assert_ack(transaction):
+    assert transaction.ack
+    assert not transaction.err
+
+def assert_read(transaction, expected):
+    assert_ack(transaction)
+    assert transaction.read_data == expected, \
+        f"Error at address {transaction.address}: expected {hex(expected)}, got {hex(transaction.read_data)}"
 
 @cocotb.coroutine
 async def reset(dut):
     dut.rst.value = 1
     # Manually clear RAM for test repeatability
-    dut.ram.ram.mem.value = [0] * len(dut.ram.ram.mem.value)
+    MemoryBackdoor(dut.ram.ram).fill(0)
     await RisingEdge(dut.clk)
     for wb in [dut.wb_a, dut.wb_b]:
         wb.cyc.value = 0
         wb.stb.value = 0
         wb.select.value = 0
+        wb.cti.value = 0
+        wb.bte.value = 0
         wb.write_enable.value = 0
         wb.addr.value = 0
         wb.write_data.value = 0
@@ -52,6 +42,8 @@ async def dual_port_wishbone_ram_test(dut):
     """Test dual-ported Wishbone RAM backed by dual-port RAM."""
     cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
     await reset(dut)
+    master_a = WishboneMaster(dut.clk, dut.wb_a)
+    master_b = WishboneMaster(dut.clk, dut.wb_b)
 
     test_data = [
         (0, 0xDEADBEEF),
@@ -62,173 +54,229 @@ async def dual_port_wishbone_ram_test(dut):
 
     # BASIC WORD WRITE TEST: wb_a writes, wb_b reads
     for address, data in test_data:
-        start_write_txn(dut.wb_a, address, data, 0b1111)
-
-        await RisingEdge(dut.clk)
-
-        # Immediately
-        # send a read request (pipeline mode)
-        finish_txn(dut.wb_a)
-
-        start_read_txn(dut.wb_a, address, 0b1111)
-        start_read_txn(dut.wb_b, address, 0b1111)
-
-        # Verify by reading back
-        await RisingEdge(dut.clk)
-
-        # Write request has been acknowledged
-        assert_ack(dut.wb_a)
-
-        await RisingEdge(dut.clk)
-
-        assert_read(dut.wb_a, address, data)
-        finish_txn(dut.wb_a)
-
-        assert_read(dut.wb_b, address, data)
-        finish_txn(dut.wb_b)
-
-        await RisingEdge(dut.clk)
+        write = master_a.write(address, data)
+        read_a = master_a.read(address)
+        # Port B reads once the write has gone through
+        await write
+        read_b = master_b.read(address)
 
+        assert_ack(write)
+        assert_read(await read_a, data)
+        assert_read(await read_b, data)
 
     # WRITE TEST #2: wb_b writes, wb_a reads
     for i in range(0, 40, 4):
         address = i
         data = i
-        start_write_txn(dut.wb_b, address, data, 0b1111)
-
-        await RisingEdge(dut.clk)
-
-        finish_txn(dut.wb_b)
-
-        # Immediately start read and
-        # check that setting write_data doesn't affect RAM state
-        start_read_txn(dut.wb_a, address, 0b1111)
-        start_read_txn(dut.wb_b, address, 0b1111)
-        dut.wb_a.write_data = 0xFAFABEBE
-        await RisingEdge(dut.clk)
-
-        # Verify by reading back
-        await RisingEdge(dut.clk)
-
-        # Write request has been acknowledged
-        assert_ack(dut.wb_b)
-        assert_read(dut.wb_a, i, i)
-        
-        # Read back a second time, now on both ports
-        await RisingEdge(dut.clk)
-
-        assert_read(dut.wb_a, address, data)
-        finish_txn(dut.wb_a)
-
-        assert_read(dut.wb_b, address, data)
-        finish_txn(dut.wb_b)
-
-        await RisingEdge(dut.clk)
-
-    # NO WRITE TEST: wb_a reads, wb_b sets write_data but no write
-    for i in range(0, 40, 4):
-        start_read_txn(dut.wb_a, i, 0b1111)
-        # Check that setting write_data doesn't affect RAM state
-        dut.wb_a.write_data.value = 0xBEBECACA
-        dut.wb_b.write_data.value = 0xCACABEBE
-
-        await RisingEdge(dut.clk)
-        await RisingEdge(dut.clk)
-
-        assert_read(dut.wb_a, i, i)
-        finish_txn(dut.wb_a)
-
-        await RisingEdge(dut.clk)
+        write = await master_b.write(address, data)
+        assert_ack(write)
+
+        # Check that setting write_data on reads doesn't affect RAM state,
+        # and read back a second time, now on both ports
+        reads_a = [master_a.submit(WishboneTransaction(address, False, 0xFAFABEBE)) for _ in range(2)]
+        read_b = master_b.read(address)
+        for read in reads_a:
+            assert_read(await read, data)
+        assert_read(await read_b, data)
+
+    # NO WRITE TEST: wb_a reads, with write_data set but no write
+    reads = await master_a.run([WishboneTransaction(i, False, 0xBEBECACA) for i in range(0, 40, 4)])
+    for i, read in zip(range(0, 40, 4), reads):
+        assert_read(read, i)
 
     # BYTE WRITE TEST: wb_a writes with byte enables, wb_b reads
     for byte_enable in range(16):
         # We reset memory...
         await reset(dut)
-        # Generate mask from byte_enable
-        mask = 0
-
-        for j in range(4):
-            if (byte_enable >> j) & 1:
-                mask |= (0xFF << (j * 8))
-
+        mask = byte_mask(byte_enable)
         print(f"mask: {mask}")
 
         for address, data in test_data:
-            start_write_txn(dut.wb_a, address, data, byte_enable)
-
-            # Write
-            await RisingEdge(dut.clk)
-
-            finish_txn(dut.wb_a)
+            assert_ack(await master_a.write(address, data, byte_enable))
             # Read all bytes in word for good measure
-            start_read_txn(dut.wb_b, address, 0b1111)
-
-            await RisingEdge(dut.clk)
-
-            # Verify by reading back
-            await RisingEdge(dut.clk)
+            read = await master_b.read(address, 0b1111)
 
-            read_val = dut.wb_b.read_data.value
-            mem_val = dut.ram.ram.mem.value[int(address/4)]
-            assert (read_val & mask) == (data & mask)
-            assert (read_val & ~mask) == (mem_val & ~mask)
-
-            finish_txn(dut.wb_b)
-            await RisingEdge(dut.clk)
+            mem_val = MemoryBackdoor(dut.ram.ram)[int(address/4)]
+            assert_ack(read)
+            assert (read.read_data & mask) == (data & mask)
+            assert (read.read_data & ~mask) == (mem_val & ~mask)
 
     # SIMULTANEOUS WRITE TEST: both ports write to different addresses
-    start_write_txn(dut.wb_a, 0, 0xB1AB2, 0b1111)
-    start_write_txn(dut.wb_b, 4, 0x7777, 0b1111)
-
-    await RisingEdge(dut.clk)
+    write_a = master_a.write(0, 0xB1AB2)
+    write_b = master_b.write(4, 0x7777)
+    read_a = master_a.read(0)
+    read_b = master_b.read(4)
 
-    finish_txn(dut.wb_a)
-    finish_txn(dut.wb_b)
+    assert_ack(await write_a)
+    assert_ack(await write_b)
+    assert_read(await read_a, 0xB1AB2)
+    assert_read(await read_b, 0x7777)
 
-    start_read_txn(dut.wb_a, 0, 0b1111)
-    start_read_txn(dut.wb_b, 4, 0b1111)
+    master_a.stop()
+    master_b.stop()
 
-    await RisingEdge(dut.clk)
-
-    assert_ack(dut.wb_a)
-    assert_ack(dut.wb_b)
-
-    await RisingEdge(dut.clk)
-    assert_read(dut.wb_a, 0, 0xB1AB2)
-    assert_read(dut.wb_b, 4, 0x7777)
-    finish_txn(dut.wb_a)
-    finish_txn(dut.wb_b)
-
-    await RisingEdge(dut.clk)
-
-    # ERROR TEST: misaligned accesses
-
-    # Write some data and wait for write to happen
-    start_write_txn(dut.wb_a, 0x0, 0xb1abc001, 0b1111)
-
-    await RisingEdge(dut.clk)
-    finish_txn(dut.wb_a)
-
-    await RisingEdge(dut.clk)
-    assert_ack(dut.wb_a)
-
-    start_write_txn(dut.wb_a, 0x1, 0x00000000, 0b1111)
-
-    await RisingEdge(dut.clk)
-
-    finish_txn(dut.wb_a)
-
-    await RisingEdge(dut.clk)
+@cocotb.test()
+async def dual_port_throughput_test(dut):
+    """Both ports sustain one transaction per clock at the same time"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    master_a = WishboneMaster(dut.clk, dut.wb_a)
+    master_b = WishboneMaster(dut.clk, dut.wb_b)
+
+    words = len(MemoryBackdoor(dut.ram.ram))
+    rng = random.Random(0)
+    # Each port owns half of the RAM
+    data = [rng.getrandbits(32) for _ in range(words)]
+    halves = [range(0, words // 2), range(words // 2, words)]
+
+    requests = []
+    for master, half in zip([master_a, master_b], halves):
+        transactions = [WishboneTransaction(4 * w, True, data[w]) for w in half] + \
+            [WishboneTransaction(4 * w, False) for w in half]
+        requests.append(transactions)
+
+    # Queue everything on both ports before the first clock edge
+    start = master_a.cycle
+    for master, transactions in zip([master_a, master_b], requests):
+        for transaction in transactions:
+            master.submit(transaction)
+    await master_a.wait_idle()
+    await master_b.wait_idle()
+
+    for transactions in requests:
+        for i, transaction in enumerate(transactions):
+            # One request accepted every clock, one ACK every clock
+            assert transaction.issue_cycle == start + 1 + i
+            assert transaction.latency == 1
+            if not transaction.write:
+                assert_read(transaction, data[transaction.address // 4])
+
+    cycles = max(transactions[-1].response_cycle for transactions in requests) - start
+    total = sum(len(transactions) for transactions in requests)
+    dut._log.info(f"{total} transactions in {cycles} cycles: {total / cycles:.2f} transactions/cycle")
+    assert cycles == len(requests[0]) + 1
+
+    master_a.stop()
+    master_b.stop()
+
+NUM_WRITES = 100_000
 
-    assert dut.wb_a.ack.value == 0
-    assert dut.wb_a.err.value == 1
+@cocotb.test()
+async def random_write_scoreboard_test(dut):
+    """Random pipelined byte-enable writes on both ports, checked against the reference model in one go"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    backdoor = MemoryBackdoor(dut.ram.ram)
+    model = MemoryModel(4 * len(backdoor))
+    masters = [WishboneMaster(dut.clk, dut.wb_a), WishboneMaster(dut.clk, dut.wb_b)]
+    half = len(backdoor) // 2
+
+    # Each port writes its own half
+    rng = np.random.default_rng(0)
+    writes = []
+    for i, master in enumerate(masters):
+        addresses = 4 * (rng.integers(0, half, NUM_WRITES // 2) + i * half)
+        data = rng.integers(0, 1 << 32, NUM_WRITES // 2, dtype=np.uint64)
+        selects = rng.integers(0, 16, NUM_WRITES // 2)
+        for address, word, select in zip(addresses.tolist(), data.tolist(), selects.tolist()):
+            master.submit(WishboneTransaction(address, True, word, select))
+        writes.append((addresses, data, selects))
+
+    for master in masters:
+        await master.wait_idle()
+        master.stop()
+
+    for addresses, data, selects in writes:
+        model.write_many(addresses, data, selects)
+    Scoreboard(model, backdoor).check()
+
+# Byte enables of typical CPU stores: words, halfwords and bytes
+CPU_SELECTS = {
+    0b1111: 4,
+    0b0011: 1, 0b1100: 1,
+    0b0001: 1, 0b0010: 1, 0b0100: 1, 0b1000: 1,
+}
+
+def traffic_scenarios(words):
+    """(name, profile for port A, profile for port B, transactions per port)"""
+    half = words // 2
+    return [
+        # Both ports at full rate, each on its own half
+        ("full_rate", TrafficProfile(range(0, half)), TrafficProfile(range(half, words)), 2000),
+        # Packet buffer: port A writes packets in, port B reads them out, slower
+        ("packet_buffer",
+         TrafficProfile(range(0, words), injection_rate=0.9, read_fraction=0.0, sequential=0.95),
+         TrafficProfile(range(0, words), injection_rate=0.6, read_fraction=1.0, sequential=0.95),
+         2000),
+        # Partial writes from CPU-like ports, sometimes hitting the same few words
+        ("collisions",
+         TrafficProfile(range(0, words), injection_rate=0.7, selects=CPU_SELECTS,
+                        hot_words=range(0, 4), hot_fraction=0.5),
+         TrafficProfile(range(0, words), injection_rate=0.7, selects=CPU_SELECTS,
+                        hot_words=range(0, 4), hot_fraction=0.5),
+         2000),
+    ]
 
-    # Re-read to confirm data is unchanged
-    start_read_txn(dut.wb_a, 0x0, 0b1111)
-    
-    await RisingEdge(dut.clk)
-    finish_txn(dut.wb_a)
+@cocotb.test()
+async def traffic_test(dut):
+    """Independent constrained-random traffic on both ports, checked against the reference model"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    words = len(MemoryBackdoor(dut.ram.ram))
 
-    await RisingEdge(dut.clk)
+    for seed, (name, profile_a, profile_b, count) in enumerate(traffic_scenarios(words)):
+        await reset(dut)
+        backdoor = MemoryBackdoor(dut.ram.ram)
+        model = MemoryModel(4 * words)
+        # Created together, so both masters count the same cycles
+        masters = [WishboneMaster(dut.clk, dut.wb_a), WishboneMaster(dut.clk, dut.wb_b)]
+        generators = [
+            TrafficGenerator(masters[0], profile_a, seed=2 * seed),
+            TrafficGenerator(masters[1], profile_b, seed=2 * seed + 1),
+        ]
+
+        runs = [cocotb.start_soon(generator.run(count)) for generator in generators]
+        for run in runs:
+            await run
+
+        check_concurrent(model, [generator.transactions for generator in generators])
+        Scoreboard(model, backdoor).check()
+
+        for port, (generator, profile) in zip("ab", zip(generators, [profile_a, profile_b])):
+            transactions_per_cycle, bytes_per_cycle = generator.bandwidth()
+            dut._log.info(
+                f"{name}, port {port}: {transactions_per_cycle:.3f} transactions/cycle, "
+                f"{bytes_per_cycle:.3f} bytes/cycle"
+            )
+            # The RAM never stalls, so each port keeps up with its injection rate
+            assert transactions_per_cycle > 0.9 * profile.injection_rate
+
+        for master in masters:
+            master.stop()
 
-    assert_read(dut.wb_a, 0x0, 0xb1abc001)
+@cocotb.test()
+async def large_ram_traffic_test(dut):
+    """Local traffic on both ports of an 8 MiB RAM, checked against a sparse model"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    for wb in [dut.wb_large_a, dut.wb_large_b]:
+        idle_bus(wb)
+    await reset(dut)
+    backdoor = MemoryBackdoor(dut.ram_large.ram)
+    words = len(backdoor)
+    # The RAM is not cleared: bytes never written are unknown to the model
+    model = SparseMemoryModel(4 * words, page_size=256)
+
+    masters = [WishboneMaster(dut.clk, dut.wb_large_a), WishboneMaster(dut.clk, dut.wb_large_b)]
+    # Mostly sequential, so the ports sweep a few regions each,
+    # and sometimes meet in a shared one
+    profile = TrafficProfile(range(0, words), sequential=0.98, selects=CPU_SELECTS,
+                             hot_words=range(0x1000, 0x1010), hot_fraction=0.05)
+    generators = [TrafficGenerator(master, profile, seed=i) for i, master in enumerate(masters)]
+    runs = [cocotb.start_soon(generator.run(4000)) for generator in generators]
+    for run in runs:
+        await run
+    for master in masters:
+        master.stop()
+
+    check_concurrent(model, [generator.transactions for generator in generators])
+    dut._log.info(f"{4 * words >> 20} MiB RAM, model holds {model.allocated >> 10} KiB")
+    Scoreboard(model, backdoor).check()
@@ -1,7 +1,16 @@
 import cocotb
-from cocotb.triggers import Timer
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, Timer
+from collections import deque
+from memutils_tb import (
+    MemoryBackdoor, WishboneMaster, WishboneSlaveBundle, WishboneTransaction, burst_read, idle_bus, single_read,
+)
+import random
 
 def reset(dut):
+    # Held in reset, with nothing in flight, for the combinatorial checks
+    dut.rst.value = 1
+    dut.clk.value = 0
     dut.slave_select.value = 0
 
     dut.master.cyc.value = 0
@@ -105,4 +114,206 @@ async def test_wishbone_demux_basic(dut):
     assert dut.master.stall.value == 1
     assert dut.master.rty.value == 1
     assert dut.master.err.value == 1
-    assert dut.master.read_data.value == 0xB1AB2
\ No newline at end of file
+    assert dut.master.read_data.value == 0xB1AB2
+
+# Address-decoded muxes instantiated by the test top, keyed by slave count.
+# Slave i answers to the 4 KiB region starting at i * REGION_SIZE.
+REGION_SIZE = 0x1000
+DECODED_MUXES = [2, 4, 8, 16]
+
+def reset_bus(master, slaves):
+    master.cyc.value = 0
+    master.stb.value = 0
+    master.write_enable.value = 0
+    master.addr.value = 0
+    master.write_data.value = 0
+    master.select.value = 0
+    master.cti.value = 0
+    master.bte.value = 0
+    master.lock.value = 0
+
+    for slave in slaves:
+        slave.ack.value = 0
+        slave.stall.value = 0
+        slave.rty.value = 0
+        slave.err.value = 0
+        slave.read_data.value = 0
+
+@cocotb.test()
+async def test_wishbone_mux_decode_sweep(dut):
+    """Test address-decoded WishboneMux routing with 2, 4, 8 and 16 slaves."""
+
+    dut.rst.value = 1
+    dut.clk.value = 0
+    await Timer(1, units='ns')
+
+    for num_slaves in DECODED_MUXES:
+        master = getattr(dut, f"master{num_slaves}")
+        slaves = [getattr(dut, f"slaves{num_slaves}")[i] for i in range(num_slaves)]
+
+        reset_bus(master, slaves)
+        await Timer(1, units='ns')
+
+        for target in range(num_slaves):
+            for i, slave in enumerate(slaves):
+                slave.ack.value = 1
+                slave.stall.value = 0
+                slave.read_data.value = 0xA5000000 | i
+
+            master.cyc.value = 1
+            master.stb.value = 1
+            master.write_enable.value = 1
+            master.addr.value = target * REGION_SIZE + 0x24
+            master.write_data.value = 0xDEADBEEF
+            master.select.value = 0xF
+
+            await Timer(1, units='ns')
+
+            for i, slave in enumerate(slaves):
+                selected = int(i == target)
+                assert slave.cyc.value == selected, f"{num_slaves} slaves: CYC on slave {i} for target {target}"
+                assert slave.stb.value == selected, f"{num_slaves} slaves: STB on slave {i} for target {target}"
+
+            assert slaves[target].addr.value == target * REGION_SIZE + 0x24
+            assert slaves[target].write_data.value == 0xDEADBEEF
+            assert slaves[target].select.value == 0xF
+
+            assert master.ack.value == 1
+            assert master.err.value == 0
+            assert master.read_data.value == 0xA5000000 | target
+
+            # STALL must only come from the selected slave
+            slaves[target].stall.value = 1
+            await Timer(1, units='ns')
+            assert master.stall.value == 1
+            slaves[target].stall.value = 0
+            slaves[(target + 1) % num_slaves].stall.value = 1
+            await Timer(1, units='ns')
+            assert master.stall.value == 0
+
+        # Unmapped addresses select no slave
+        master.addr.value = num_slaves * REGION_SIZE
+        await Timer(1, units='ns')
+
+        assert master.err.value == 0
+        assert master.ack.value == 0
+        for slave in slaves:
+            assert slave.cyc.value == 0
+            assert slave.stb.value == 0
+
+        # They are answered with ERR in the next cycle
+        dut.rst.value = 0
+        await Timer(1, units='ns')
+        dut.clk.value = 1
+        await Timer(1, units='ns')
+        assert master.err.value == 1
+        assert master.ack.value == 0
+        dut.clk.value = 0
+        dut.rst.value = 1
+
+        reset_bus(master, slaves)
+        await Timer(1, units='ns')
+
+async def pipelined_slave(clk, wb, index, latency, rng):
+    """Pipelined slave answering every request with ACK, `latency`
+    cycles after accepting it, with random STALL. Read data tells the
+    slave and the address apart"""
+    bus = WishboneSlaveBundle(wb)
+    bus.write(ack=0, err=0, rty=0, stall=0, read_data=0)
+    stall = 0
+    # Cycles at which responses are due, and their data
+    responses = deque()
+    cycle = 0
+    while True:
+        await RisingEdge(clk)
+        cycle += 1
+        sample = bus.sample()
+
+        if sample.cyc != 1:
+            responses.clear()
+        elif sample.stb == 1 and not stall:
+            responses.append((cycle + latency - 1, (index << 24) | (sample.addr & 0xFFF)))
+
+        if responses and responses[0][0] == cycle:
+            _, data = responses.popleft()
+            bus.drive(ack=1, read_data=data)
+        else:
+            bus.drive(ack=0, read_data=0)
+        stall = int(rng.random() < 0.2)
+        bus.drive(stall=stall)
+        bus.flush()
+
+@cocotb.test()
+async def test_wishbone_mux_pipelined(dut):
+    """Back-to-back pipelined requests across slaves of different
+    latencies get every response, in order, from the right slave."""
+    num_slaves = 4
+    master_wb = dut.master4
+    slaves = [dut.slaves4[i] for i in range(num_slaves)]
+
+    reset_bus(master_wb, slaves)
+    dut.rst.value = 1
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    rng = random.Random(1)
+    responders = [
+        cocotb.start_soon(pipelined_slave(dut.clk, slave, i, 1 + i, rng))
+        for i, slave in enumerate(slaves)
+    ]
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    master = WishboneMaster(dut.clk, master_wb)
+    requests = []
+    for _ in range(1000):
+        # Mostly mapped, sometimes past the last slave
+        region = rng.randrange(num_slaves + 1)
+        requests.append(WishboneTransaction(region * REGION_SIZE + 4 * rng.randrange(REGION_SIZE // 4), False))
+    transactions = await master.run(requests)
+    master.stop()
+    for responder in responders:
+        responder.kill()
+
+    for transaction in transactions:
+        region = transaction.address // REGION_SIZE
+        if region < num_slaves:
+            assert transaction.ack and not transaction.err, f"{transaction} not acknowledged"
+            expected = (region << 24) | (transaction.address & 0xFFF)
+            assert transaction.read_data == expected, \
+                f"{transaction}: expected {hex(expected)}, got {hex(transaction.read_data)}"
+        else:
+            assert transaction.err and not transaction.ack, f"{transaction} not answered with ERR"
+
+    cycles = transactions[-1].response_cycle - transactions[0].issue_cycle + 1
+    dut._log.info(f"{len(transactions)} pipelined requests across {num_slaves} slaves in {cycles} cycles")
+
+@cocotb.test()
+async def test_wishbone_mux_burst_switch(dut):
+    """Bursts and single reads to two RAMs, all in a single bus cycle:
+    the mux moves on to the other RAM once each burst is over."""
+    wb = dut.master_ram
+    idle_bus(wb)
+    dut.rst.value = 1
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    contents = []
+    for i in range(2):
+        backdoor = MemoryBackdoor(dut.g_rams[i].ram.ram)
+        contents.append([(i << 24) | j for j in range(len(backdoor))])
+        backdoor.load(contents[i])
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    wb.cyc.value = 1
+    assert await burst_read(dut.clk, wb, 0x40, 4) == contents[0][16:20]
+    assert await single_read(dut.clk, wb, REGION_SIZE + 0x80) == contents[1][32]
+    assert await burst_read(dut.clk, wb, REGION_SIZE + 0x100, 8) == contents[1][64:72]
+    assert await single_read(dut.clk, wb, 0x10) == contents[0][4]
+    assert await burst_read(dut.clk, wb, 0x200, 4) == contents[0][128:132]
+    assert await burst_read(dut.clk, wb, REGION_SIZE + 0x200, 4) == contents[1][128:132]
+    idle_bus(wb)
+
+    await RisingEdge(dut.clk)
+    assert wb.ack.value == 0
@@ -0,0 +1,196 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, WishboneBundle, WishboneMaster, WishboneMonitor, WishboneTransaction, idle_bus
+import random
+
+# Size of each RAM, in bytes
+RAM_SIZE = 16384
+TRACE_LENGTH = 5000
+
+def initial_word(index):
+    return (0x5EED0000 ^ (index * 0x9E3779B1)) & 0xFFFFFFFF
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    for ram in [dut.ram, dut.direct_ram]:
+        backdoor = MemoryBackdoor(ram.ram)
+        backdoor.load([initial_word(i) for i in range(len(backdoor))])
+    idle_bus(dut.core)
+    idle_bus(dut.direct)
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+def fetch_trace(rng):
+    """Instruction fetch addresses: straight-line runs of code, ended by
+    taken branches, mostly short loops backwards, sometimes calls far away"""
+    trace = []
+    pc = 0
+    while len(trace) < TRACE_LENGTH:
+        for _ in range(rng.randint(2, 24)):
+            trace.append(pc)
+            pc = (pc + 4) % RAM_SIZE
+        if rng.random() < 0.7:
+            pc = (pc - 4 * rng.randint(1, 32)) % RAM_SIZE
+        else:
+            pc = rng.randrange(0, RAM_SIZE, 4)
+    return trace[:TRACE_LENGTH]
+
+async def fetch(dut, wb, trace):
+    """Fetch every address of the trace one word at a time, as a core
+    with no fetch pipelining does: each fetch is presented as soon as the
+    previous one is back. Returns the latency of each fetch, in cycles
+    from the request to its ACK, stalls included: 1 is a fetch served
+    with no wait state"""
+    bus = WishboneBundle(wb)
+    clk = RisingEdge(dut.clk)
+    latencies = []
+    for address in trace:
+        bus.write(cyc=1, stb=1, write_enable=0, select=0b1111, addr=address)
+        accepted = False
+        cycles = 0
+        while True:
+            await clk
+            sample = bus.sample()
+            if accepted and sample.ack == 1:
+                break
+            cycles += 1
+            if not accepted and sample.stall == 0:
+                accepted = True
+                bus.write(stb=0)
+        expected = initial_word(address // 4)
+        assert sample.read_data == expected, \
+            f"Fetch at {hex(address)}: expected {hex(expected)}, got {hex(sample.read_data)}"
+        latencies.append(cycles)
+    bus.idle()
+    return latencies
+
+@cocotb.test()
+async def fetch_trace_test(dut):
+    """Hit rate and average fetch latency on a fetch trace with branches"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    trace = fetch_trace(random.Random(23))
+    monitors = [WishboneMonitor(dut.clk, wb) for wb in [dut.core, dut.mem_wb, dut.direct]]
+    latencies = await fetch(dut, dut.core, trace)
+    direct_latencies = await fetch(dut, dut.direct, trace)
+    for monitor in monitors:
+        monitor.report()
+        monitor.stop()
+
+    hits = sum(latency == 1 for latency in latencies)
+    mean = sum(latencies) / len(latencies)
+    direct_mean = sum(direct_latencies) / len(direct_latencies)
+    # Branches in the trace, where the stream restarts
+    branches = sum(b != a + 4 for a, b in zip(trace, trace[1:]))
+    dut._log.info(
+        f"{len(trace)} fetches, {branches} branches: hit rate {hits / len(trace):.3f}, "
+        f"mean latency {mean:.3f} cycles, {direct_mean:.3f} without prefetch"
+    )
+
+    # Every fetch is a hit, but the branch targets and the fetch right behind them
+    assert hits >= len(trace) - 2 * (branches + 1)
+    assert mean < direct_mean
+
+@cocotb.test()
+async def sequential_test(dut):
+    """A long sequential stream, pipelined, is served one word per clock"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    master = WishboneMaster(dut.clk, dut.core)
+    transactions = await master.run([WishboneTransaction(0x100 + 4 * i, False) for i in range(512)])
+    master.stop()
+
+    for transaction in transactions:
+        assert transaction.read_data == initial_word(transaction.address // 4)
+    # After the miss, and the wait for the first word read ahead
+    steady = transactions[2:]
+    assert all(t.latency == 1 for t in steady), [t.latency for t in transactions[:16]]
+    assert steady[-1].issue_cycle - steady[0].issue_cycle == len(steady) - 1
+
+@cocotb.test()
+async def write_invalidate_test(dut):
+    """Writes to words buffered, or outside the stream, are seen by the next reads"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    master = WishboneMaster(dut.clk, dut.core)
+    expected = {}
+
+    async def read(address):
+        transaction = await master.read(address)
+        value = expected.get(address, initial_word(address // 4))
+        assert transaction.read_data == value, \
+            f"Read at {hex(address)}: expected {hex(value)}, got {hex(transaction.read_data)}"
+
+    async def write(address, value, select=0b1111):
+        await master.write(address, value, select)
+        mask = sum(0xFF << (8 * i) for i in range(4) if select >> i & 1)
+        old = expected.get(address, initial_word(address // 4))
+        expected[address] = (old & ~mask) | (value & mask)
+
+    # Start a stream, and let it read ahead
+    await read(0x200)
+    await read(0x204)
+    for _ in range(8):
+        await RisingEdge(dut.clk)
+
+    # Next word, buffered
+    await write(0x208, 0x11111111)
+    await read(0x208)
+    # Further down the stream, and a byte write
+    await write(0x210, 0x2222, 0b0011)
+    await read(0x20C)
+    await read(0x210)
+    # Outside of the stream: it goes on from the buffer
+    await write(0x1000, 0x33333333)
+    await read(0x214)
+    await read(0x1000)
+
+    # Random mix of both, pipelined
+    rng = random.Random(230)
+    for _ in range(200):
+        address = rng.randrange(0x200, 0x280, 4)
+        if rng.random() < 0.2:
+            await write(address, rng.getrandbits(32), rng.randint(1, 15))
+        else:
+            await read(address)
+    master.stop()
+
+@cocotb.test()
+async def random_access_test(dut):
+    """Random reads and writes, checked against a model, with pipelined requests"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    master = WishboneMaster(dut.clk, dut.core)
+    expected = {}
+
+    rng = random.Random(231)
+    address = 0
+    requests = []
+    for _ in range(3000):
+        if rng.random() < 0.15:
+            address = rng.randrange(0, 1024, 4)
+        else:
+            address = (address + 4) % 1024
+        if rng.random() < 0.1:
+            requests.append(master.write(address, rng.getrandbits(32)))
+        else:
+            requests.append(master.read(address))
+
+    await master.wait_idle()
+    for transaction in requests:
+        assert transaction.ack
+        word = transaction.address // 4
+        if transaction.write:
+            expected[word] = transaction.data
+        else:
+            value = expected.get(word, initial_word(word))
+            assert transaction.read_data == value, \
+                f"Read at {hex(transaction.address)}: expected {hex(value)}, got {hex(transaction.read_data)}"
+    master.stop()
@@ -0,0 +1,173 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from collections import deque
+from memutils_tb import MemoryBackdoor, WishboneMaster, WishboneSlaveBundle, WishboneTransaction, byte_mask, idle_bus
+import random
+
+# Size of every RAM, in bytes
+RAM_SIZE = 4096
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    for ram in [dut.ram32, dut.ram64, dut.ram128, dut.up_ram, dut.down_ram]:
+        MemoryBackdoor(ram.ram).fill(0)
+    await RisingEdge(dut.clk)
+
+    for wb in [dut.wb32, dut.wb64, dut.wb128, dut.up_master, dut.down_master, dut.slow_master]:
+        idle_bus(wb)
+
+    slow_slave = WishboneSlaveBundle(dut.slow_slave)
+    slow_slave.write(ack=0, err=0, rty=0, stall=0, read_data=0)
+
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+    print("reset done !")
+
+def assert_ack(transactions):
+    for transaction in transactions:
+        assert transaction.ack and not transaction.err, f"{transaction} not acknowledged"
+
+async def run_pipelined(master, requests):
+    """Issue requests back to back, and wait for all of them.
+    Returns the transactions, and the number of cycles taken"""
+    start = master.cycle
+    transactions = await master.run(requests)
+    assert_ack(transactions)
+    return transactions, transactions[-1].response_cycle - start
+
+async def check_width(dut, wb, data_width, rng):
+    """Random byte-enable writes, then reads over the whole RAM.
+    Returns the achieved bytes per cycle."""
+    master = WishboneMaster(dut.clk, wb, data_width=data_width)
+    num_bytes = data_width // 8
+    words = RAM_SIZE // num_bytes
+    full_select = (1 << num_bytes) - 1
+    model = [0] * words
+
+    writes = []
+    for _ in range(2 * words):
+        word = rng.randrange(words)
+        data = rng.getrandbits(data_width)
+        select = rng.choice([full_select, rng.getrandbits(num_bytes)])
+        mask = byte_mask(select, num_bytes)
+        model[word] = (model[word] & ~mask) | (data & mask)
+        writes.append(WishboneTransaction(word * num_bytes, True, data, select))
+
+    _, write_cycles = await run_pipelined(master, writes)
+
+    reads = [WishboneTransaction(word * num_bytes, False) for word in range(words)]
+    reads, read_cycles = await run_pipelined(master, reads)
+    master.stop()
+
+    for word, (expected, read) in enumerate(zip(model, reads)):
+        assert expected == read.read_data, \
+            f"Error at address {hex(word * num_bytes)}: expected {hex(expected)}, got {hex(read.read_data)}"
+
+    return RAM_SIZE * 3 / (write_cycles + read_cycles)
+
+@cocotb.test()
+async def width_bandwidth_test(dut):
+    """Check every datapath width, and report bytes per cycle"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+
+    configs = [
+        ("32-bit RAM", dut.wb32, 32),
+        ("64-bit RAM", dut.wb64, 64),
+        ("128-bit RAM", dut.wb128, 128),
+        ("32-bit master, 128-bit RAM", dut.up_master, 32),
+        ("128-bit master, 32-bit RAM", dut.down_master, 128),
+    ]
+    for name, wb, data_width in configs:
+        await reset(dut)
+        rng = random.Random(name)
+        bytes_per_cycle = await check_width(dut, wb, data_width, rng)
+        dut._log.info(f"{name}: {bytes_per_cycle:.2f} bytes/cycle")
+
+@cocotb.test()
+async def width_lanes_test(dut):
+    """Check that converted requests land in the right byte lanes"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    # Upsizer: four 32-bit writes fill one 128-bit word, lowest address in the lowest lane
+    up = WishboneMaster(dut.clk, dut.up_master)
+    writes = [WishboneTransaction(0x40 + 4 * i, True, 0x11111111 * (i + 1)) for i in range(4)]
+    await run_pipelined(up, writes)
+    assert MemoryBackdoor(dut.up_ram.ram)[4] == 0x44444444_33333333_22222222_11111111
+
+    # Partial write in the third lane
+    await run_pipelined(up, [WishboneTransaction(0x48, True, 0xAABBCCDD, 0b0110)])
+    assert MemoryBackdoor(dut.up_ram.ram)[4] == 0x44444444_33BBCC33_22222222_11111111
+    up.stop()
+
+    # Downsizer: one 128-bit write spreads over four 32-bit words
+    down = WishboneMaster(dut.clk, dut.down_master, data_width=128)
+    data = 0xDDDDDDDD_CCCCCCCC_BBBBBBBB_AAAAAAAA
+    await run_pipelined(down, [WishboneTransaction(0x80, True, data, 0x00F0)])
+    memory = MemoryBackdoor(dut.down_ram.ram).dump(32, 4)
+    assert list(memory) == [0, 0xBBBBBBBB, 0, 0]
+
+    (read,), _ = await run_pipelined(down, [WishboneTransaction(0x80, False)])
+    assert read.read_data == 0x00000000_00000000_BBBBBBBB_00000000
+
+    # Misaligned wide requests are rejected
+    error = await down.read(0x84)
+    assert error.err and not error.ack
+    down.stop()
+
+async def slow_slave(clk, wb, latency):
+    """Pipelined slave accepting a request every cycle, and answering
+    it `latency` cycles later with its address as read data"""
+    bus = WishboneSlaveBundle(wb)
+    bus.write(ack=0, err=0, rty=0, stall=0, read_data=0)
+    responses = deque()
+    cycle = 0
+    while True:
+        await RisingEdge(clk)
+        cycle += 1
+        sample = bus.sample()
+        if sample.cyc != 1:
+            responses.clear()
+        elif sample.stb == 1:
+            responses.append((cycle + latency - 1, sample.addr))
+
+        if responses and responses[0][0] == cycle:
+            _, address = responses.popleft()
+            bus.write(ack=1, read_data=address)
+        else:
+            bus.write(ack=0, read_data=0)
+
+@cocotb.test()
+async def width_slow_slave_test(dut):
+    """Behind a slow slave, far more narrow beats are in flight than
+    one wide request has, and a misaligned request is still answered
+    after every earlier response"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    responder = cocotb.start_soon(slow_slave(dut.clk, dut.slow_slave, 40))
+
+    master = WishboneMaster(dut.clk, dut.slow_master, data_width=64)
+    requests = [WishboneTransaction(8 * i, False) for i in range(64)]
+    requests.append(WishboneTransaction(0x204, False))
+    requests += [WishboneTransaction(0x300 + 8 * i, False) for i in range(4)]
+    transactions = await master.run(requests)
+    master.stop()
+    responder.kill()
+    idle_bus(dut.slow_master)
+
+    # Responses are matched in order: an ERR overtaking earlier
+    # reads would be taken for the oldest read in flight
+    for transaction in transactions:
+        if transaction.address % 8:
+            assert transaction.err and not transaction.ack, f"{transaction} not answered with ERR"
+        else:
+            assert transaction.ack and not transaction.err, f"{transaction} not acknowledged"
+            # Both narrow beats, packed low word first
+            expected = ((transaction.address + 4) << 32) | transaction.address
+            assert transaction.read_data == expected, \
+                f"{transaction}: expected {hex(expected)}, got {hex(transaction.read_data)}"
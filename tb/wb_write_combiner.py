@@ -0,0 +1,199 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from memutils_tb import MemoryBackdoor, MemoryModel, Scoreboard, WishboneMaster, WishboneMonitor, WishboneTransaction, idle_bus
+import random
+
+# Size of each RAM, in bytes
+RAM_SIZE = 16384
+
+def initial_word(index):
+    return (0xC0DE0000 ^ (index * 0x9E3779B1)) & 0xFFFFFFFF
+
+@cocotb.coroutine
+async def reset(dut):
+    # Reset is high to conform to wishbone spec
+    dut.rst.value = 1
+    for ram in [dut.ram, dut.direct_ram]:
+        backdoor = MemoryBackdoor(ram.ram)
+        backdoor.load([initial_word(i) for i in range(len(backdoor))])
+    idle_bus(dut.core)
+    idle_bus(dut.direct)
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+    dut.rst.value = 0
+    await RisingEdge(dut.clk)
+
+def byte_memcpy(src, dst, length):
+    """Requests of a memcpy copying a byte at a time: a byte load from
+    `src`, then a byte store to `dst`, as (address, write, data, select)"""
+    requests = []
+    for i in range(length):
+        load, store = src + i, dst + i
+        requests.append((load & ~3, False, 0, 1 << (load & 3)))
+        value = (initial_word((src + i) // 4) >> (8 * (load & 3))) & 0xFF
+        requests.append((store & ~3, True, value << (8 * (store & 3)), 1 << (store & 3)))
+    return requests
+
+async def replay(dut, wb, ram_wb, requests):
+    """Issue every request pipelined on `wb`, and monitor the RAM port. Returns
+    the transactions and the RAM port summary"""
+    master = WishboneMaster(dut.clk, wb)
+    monitor = WishboneMonitor(dut.clk, ram_wb)
+    transactions = await master.run([WishboneTransaction(*request) for request in requests])
+    master.stop()
+    # Let the last combined write out
+    for _ in range(4):
+        await RisingEdge(dut.clk)
+    monitor.stop()
+    return transactions, monitor.report()
+
+def check_reads(transactions, model):
+    """Replay the transactions on the model, checking the selected bytes of every read"""
+    for transaction in transactions:
+        assert transaction.ack, f"{transaction} not acknowledged"
+        if transaction.write:
+            model.write(transaction.address, transaction.data, transaction.select)
+        else:
+            mask = sum(0xFF << (8 * i) for i in range(4) if transaction.select >> i & 1)
+            expected = model.read(transaction.address)
+            assert transaction.read_data & mask == expected & mask, \
+                f"Read at {hex(transaction.address)}: expected {hex(expected & mask)}, got {hex(transaction.read_data & mask)}"
+
+def new_model():
+    model = MemoryModel(RAM_SIZE)
+    model.load([initial_word(i) for i in range(RAM_SIZE // 4)])
+    return model
+
+@cocotb.test()
+async def byte_memcpy_test(dut):
+    """RAM port utilization of an unaligned byte-by-byte memcpy, with and without combining"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    length = 4001
+    requests = byte_memcpy(0x0003, 0x2001, length)
+    transactions, combined = await replay(dut, dut.core, dut.mem_wb, requests)
+    direct_transactions, direct = await replay(dut, dut.direct, dut.direct, requests)
+
+    dut._log.info(
+        f"{length}-byte memcpy: {combined['writes']} RAM writes and utilization {combined['utilization']:.3f} "
+        f"with write combining, {direct['writes']} RAM writes and utilization {direct['utilization']:.3f} without"
+    )
+
+    model = new_model()
+    check_reads(transactions, model)
+    check_reads(direct_transactions, new_model())
+    Scoreboard(model, MemoryBackdoor(dut.ram.ram)).check()
+    Scoreboard(model, MemoryBackdoor(dut.direct_ram.ram)).check()
+
+    assert direct["writes"] == length
+    # One write per destination word, partial at both ends
+    assert combined["writes"] == (0x2001 + length + 3) // 4 - 0x2001 // 4
+    assert combined["reads"] == length
+
+@cocotb.test()
+async def byte_stream_test(dut):
+    """Bytes, then half-words, streamed to consecutive addresses: one RAM write per word"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    requests = [(0x1000 + (i & ~3), True, (i & 0xFF) << (8 * (i & 3)), 1 << (i & 3)) for i in range(1024)]
+    requests += [(0x2000 + 4 * (i // 2), True, 0xBEEF << (16 * (i % 2)), 0b11 << (2 * (i % 2))) for i in range(512)]
+    transactions, summary = await replay(dut, dut.core, dut.mem_wb, requests)
+
+    model = new_model()
+    check_reads(transactions, model)
+    Scoreboard(model, MemoryBackdoor(dut.ram.ram)).check()
+    assert summary["writes"] == 256 + 256
+    assert summary["reads"] == 0
+
+@cocotb.test()
+async def read_pending_test(dut):
+    """Reads of a word being combined see the bytes written so far"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    requests = [
+        (0x100, True, 0x000000AA, 0b0001),
+        (0x100, False, 0, 0b1111),
+        (0x100, True, 0x0000BB00, 0b0010),
+        (0x104, False, 0, 0b1111),
+        (0x100, True, 0x00CC0000, 0b0100),
+        (0x100, False, 0, 0b0100),
+        (0x104, True, 0x11223344, 0b1111),
+        (0x104, False, 0, 0b1111),
+        # Misaligned writes are forwarded, and answered with ERR by the RAM
+        (0x102, True, 0xFFFFFFFF, 0b1111),
+        (0x100, False, 0, 0b1111),
+    ]
+    master = WishboneMaster(dut.clk, dut.core)
+    transactions = await master.run([WishboneTransaction(*request) for request in requests])
+    master.stop()
+
+    assert transactions[8].err
+    del transactions[8]
+    check_reads(transactions, new_model())
+
+@cocotb.test()
+async def random_access_test(dut):
+    """Random pipelined reads and writes of all sizes, on a few words, checked against a model"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+
+    rng = random.Random(24)
+    requests = []
+    for _ in range(5000):
+        address = rng.randrange(0x400, 0x440, 4)
+        select = rng.choice([0b0001, 0b0010, 0b0100, 0b1000, 0b0011, 0b1100, 0b1111])
+        if rng.random() < 0.6:
+            requests.append((address, True, rng.getrandbits(32), select))
+        else:
+            requests.append((address, False, 0, select))
+    transactions, _ = await replay(dut, dut.core, dut.mem_wb, requests)
+
+    model = new_model()
+    check_reads(transactions, model)
+    Scoreboard(model, MemoryBackdoor(dut.ram.ram)).check()
+
+@cocotb.test()
+async def abort_test(dut):
+    """A core dropping CYC right after a request gets no response for it,
+    and its next bus cycle only sees its own responses"""
+    cocotb.start_soon(Clock(dut.clk, 1, units="ns").start())
+    await reset(dut)
+    core = dut.core
+
+    # Posted write
+    core.cyc.value = 1
+    core.stb.value = 1
+    core.write_enable.value = 1
+    core.select.value = 0b1111
+    core.addr.value = 0x200
+    core.write_data.value = 0x600DF00D
+    await RisingEdge(dut.clk)
+    assert core.stall.value == 0
+
+    idle_bus(core)
+    for _ in range(4):
+        await RisingEdge(dut.clk)
+        assert core.ack.value == 0 and core.err.value == 0, "Response after CYC dropped"
+    # The write was accepted, so it still goes out
+    assert MemoryBackdoor(dut.ram.ram)[0x200 // 4] == 0x600DF00D
+
+    # Forwarded read
+    core.cyc.value = 1
+    core.stb.value = 1
+    core.write_enable.value = 0
+    core.addr.value = 0x300
+    await RisingEdge(dut.clk)
+    assert core.stall.value == 0
+
+    idle_bus(core)
+    await RisingEdge(dut.clk)
+    assert core.ack.value == 0, "Response after CYC dropped"
+
+    master = WishboneMaster(dut.clk, core)
+    read = await master.read(0x304)
+    master.stop()
+    assert read.ack and read.read_data == initial_word(0x304 // 4), f"{read} got a stale response"